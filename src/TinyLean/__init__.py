@@ -4,11 +4,17 @@ from itertools import count
 fresh = count(1).__next__
 
 
-@dataclass(frozen=True)
+@dataclass(frozen=True, eq=False, slots=True)
 class Name:
     text: str
     id: int = field(default_factory=fresh)
 
+    def __eq__(self, other):
+        return isinstance(other, Name) and self.id == other.id
+
+    def __hash__(self):
+        return self.id
+
     def __str__(self):
         return self.text
 
@@ -31,6 +37,7 @@ class Param[T]:
 @dataclass(frozen=True)
 class Decl:
     loc: int
+    end: int = field(default=0, kw_only=True, repr=False, compare=False)
 
 
 @dataclass(frozen=True)
@@ -90,3 +97,4 @@ class Instance[T](Decl):
     type: T
     fields: list[tuple[T, T]]
     id: int = field(default_factory=fresh)
+    params: list[Param[T]] = field(default_factory=list)
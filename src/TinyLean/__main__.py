@@ -1,30 +1,70 @@
 import sys
+from itertools import takewhile
 from pathlib import Path
 
-from pyparsing import util, exceptions
-
-from . import ast, ir
-
 
 fatal = lambda m: sys.exit(int(not print(m)))
 
 
 _F = Path(sys.argv[1]) if len(sys.argv) > 1 else None
+_ONLY = sys.argv[3] if len(sys.argv) > 3 and sys.argv[2] == "--only" else None
 
 
 def fatal_on(text: str, loc: int, m: str):
-    fatal(f"{_F}:{util.lineno(loc, text)}:{util.col(loc, text)}: {m}")
+    fatal_all(text, [(loc, m)])
+
+
+def fatal_all(text: str, errors: list[tuple[int, str]]):
+    from . import lexer
+
+    sm = lexer.source_map(text)
+    fatal("\n".join(f"{_F}:{sm.lineno(loc)}:{sm.col(loc)}: {m}" for loc, m in errors))
+
+
+def fatal_syntax(text: str, errors: list[Exception]):
+    fatal_all(text, [(e.loc, str(e).split("(at char")[0].strip()) for e in errors])
+
+
+def _parse_error():
+    from pyparsing import ParseBaseException
+
+    return ParseBaseException
+
 
+def main(file=_F if _F else fatal("usage: tinylean FILE [--only NAME]"), only=_ONLY):
+    from . import ast, ir, cache
 
-def main(file=_F if _F else fatal("usage: tinylean FILE")):
+    p = ast.RecoveringParser(file.suffix == ".md")
+    r = ast.NameResolver()
     try:
         with open(file, encoding="utf-8") as f:
             text = f.read()
-            ast.check_string(text, file.suffix == ".md")
+            c = cache.from_env(p.is_markdown)
+            if c:
+                parsed, decls = [], text | c
+            else:
+                parsed = p.stream(text)
+                clean = takewhile(lambda _: not p.errors, parsed)
+                decls = r.stream(clean)
+            try:
+                if only:
+                    decls = list(decls)
+                    g = ast.DependencyGraph.of(decls) if c else r.graph
+                    decls = g.only(decls, only)
+                for _ in ast.TypeChecker().stream(decls):
+                    pass
+            except Exception:
+                if not p.errors:
+                    raise
+            for _ in parsed:
+                pass
+            if p.errors:
+                fatal_syntax(text, p.errors)
     except OSError as e:
         fatal(e)
-    except exceptions.ParseException as e:
-        fatal_on(text, e.loc, str(e).split("(at char")[0].strip())
+    except _parse_error():
+        list(p.stream(text))
+        fatal_syntax(text, p.errors)
     except ast.UndefinedVariableError as e:
         v, loc = e.args
         fatal_on(text, loc, f"undefined variable '{v}'")
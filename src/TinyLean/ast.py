@@ -1,16 +1,16 @@
-from functools import reduce
-from itertools import chain
-from dataclasses import dataclass, field
-from typing import OrderedDict, cast as _c
-
-from pyparsing import ParseResults
+import os
+from functools import cache, reduce
+from dataclasses import dataclass, field, fields, is_dataclass, replace
+from sys import intern
+from typing import Optional, cast as _c
 
 from . import (
+    native,
+    lexer,
     Name,
     Param,
     Decl,
     ir,
-    grammar as _g,
     fresh,
     Def,
     Example,
@@ -26,6 +26,7 @@ from . import (
 @dataclass(frozen=True)
 class Node:
     loc: int
+    end: int = field(default=0, kw_only=True, repr=False, compare=False)
 
 
 @dataclass(frozen=True)
@@ -79,63 +80,270 @@ class Match(Node):
     cases: list[Case]
 
 
-_g.name.add_parse_action(lambda r: Name(r[0][0]))
-
 _ops = {"+": "add", "-": "sub", "*": "mul", "/": "div"}
+_precs = {"+": 0, "-": 0, "*": 1, "/": 1}
+
+
+def binary(loc: int, op: str, lhs: Node, rhs: Node, end: int):
+    f = Ref(loc, Name(_ops[op]), end=end)
+    return Call(loc, Call(loc, f, lhs, False, end=end), rhs, False, end=end)
+
+
+def _infix(r):
+    operands, ops = [r[0]], []
+    for op, rhs in zip(r[1::2], r[2::2]):
+        while ops and _precs[ops[-1]] >= _precs[op]:
+            _reduce(operands, ops)
+        ops.append(op)
+        operands.append(rhs)
+    while ops:
+        _reduce(operands, ops)
+    return operands[0][1]
+
+
+def _reduce(operands: list[tuple[int, Node, int]], ops: list[str]):
+    _, rhs, end = operands.pop()
+    loc, lhs, _ = operands.pop()
+    operands.append((loc, binary(loc, ops.pop(), lhs, rhs, end), end))
+
+
+@cache
+def load_grammar():
+    from . import grammar as g
+
+    g.name.add_parse_action(lambda r: Name(intern(r[0][0])))
+    g.atom.add_parse_action(lambda l, r: (l, r[0], r[1]))
+    g.expr.add_parse_action(_infix)
+    g.type_.add_parse_action(lambda l, r: Type(l, end=r[1]))
+    g.ph.add_parse_action(lambda l, r: Placeholder(l, True, end=r[1]))
+    g.ref.add_parse_action(lambda l, r: Ref(l, r[0][0], end=r[1]))
+    g.i_param.add_parse_action(lambda r: Param(r[0], r[1], True))
+    g.e_param.add_parse_action(lambda r: Param(r[0], r[1], False))
+    g.c_param.add_parse_action(lambda r: Param(r[0], r[1], True, True))
+    g.fn_type.add_parse_action(lambda l, r: FnType(l, r[0], r[1], end=r[2]))
+    g.fn.add_parse_action(
+        lambda l, r: reduce(lambda a, n: Fn(l, n, a, end=r[2]), reversed(r[0]), r[1])
+    )
+    g.match.add_parse_action(lambda l, r: Match(l, r[0], list(r[1]), end=r[2]))
+    g.case.add_parse_action(lambda r: Case(r[0].loc, r[0], list(r[1]), r[2], end=r[3]))
+    g.nomatch.add_parse_action(lambda l, r: Nomatch(l, r[0][0], end=r[1]))
+    g.i_arg.add_parse_action(lambda l, r: (r[1], r[0], r[2]))
+    g.e_arg.add_parse_action(lambda l, r: (r[0], False, r[1]))
+    g.call.add_parse_action(
+        lambda l, r: reduce(lambda a, b: Call(l, a, b[0], b[1], end=b[2]), r[1:], r[0])
+    )
+    g.p_expr.add_parse_action(lambda r: r[0])
+
+    g.return_type.add_parse_action(
+        lambda l, r: r[0] if len(r) else Placeholder(l, False, end=l)
+    )
+    g.def_.add_parse_action(
+        lambda r: Def(r[0].loc, r[0].name, list(r[1]), r[2], r[3], end=r[4])
+    )
+    g.example.add_parse_action(
+        lambda l, r: Example(l, list(r[0]), r[1], r[2], end=r[3])
+    )
+    g.type_arg.add_parse_action(lambda r: (r[0], r[1]))
+    g.ctor.add_parse_action(
+        lambda r: Ctor(r[0].loc, r[0].name, list(r[1]), list(r[2]), end=r[3])
+    )
+    g.data.add_condition(
+        lambda r: r[0].name.text == r[3], message="open and datatype name mismatch"
+    ).add_parse_action(
+        lambda r: Data(r[0].loc, r[0].name, list(r[1]), list(r[2]), end=r[4])
+    )
+    g.c_field.add_parse_action(lambda l, r: Field(l, r[0], r[1], end=r[2]))
+    g.class_.add_condition(
+        lambda r: r[0].name.text == r[3], message="open and class name mismatch"
+    ).add_parse_action(
+        lambda r: Class(r[0].loc, r[0].name, list(r[1]), list(r[2]), end=r[4])
+    )
+    g.i_field.add_parse_action(lambda r: (r[0], r[1]))
+    g.inst.add_parse_action(
+        lambda l, r: Instance(l, r[1], list(r[2]), params=list(r[0]), end=r[3])
+    )
+    return g
 
 
-def _infix(loc: int, ret: ParseResults):
-    r = ret[0]
-    if not isinstance(r, ParseResults):
-        return r
-    return Call(loc, Call(loc, Ref(loc, Name(_ops[r[1]])), r[0], False), r[2], False)
+@dataclass(frozen=True)
+class Parser:
+    is_markdown: bool = False
+    engine: str = "pyparsing"
+    jobs: int = 1
+    min_chunks: int = 64
 
+    def __ror__(self, s: str):
+        if self.jobs > 1 and not self.is_markdown:
+            return self._parallel(s)
+        if self.is_markdown or self.engine == "native":
+            return list(self.stream(s))
+        return list(load_grammar().program.parse_string(s, parse_all=True))
+
+    def stream(self, s: str):
+        if self.is_markdown:
+            return self._markdown(s)
+        if self.engine == "native":
+            return native.stream(s)
+        return self._chunks(s)
+
+    def _markdown(self, s):
+        from pyparsing import ParseBaseException
+
+        p = Parser(engine=self.engine)
+        for loc, text in lexer.fences(s):
+            try:
+                yield from _shift(p.stream(text), loc)
+            except ParseBaseException as e:
+                text = s if isinstance(s, str) else s[:].decode()
+                raise type(e)(text, e.loc + loc, e.msg) from None
+
+    def _chunks(self, s: str):
+        from pyparsing import ParseBaseException
+
+        p = Parser(engine=self.engine)
+        for loc, text in lexer.chunks(s):
+            try:
+                decls = text | p
+            except ParseBaseException:
+                try:
+                    decls = s[loc:] | p
+                except ParseBaseException as e:
+                    raise type(e)(s, e.loc + loc, e.msg) from None
+                yield from _shift(decls, loc)
+                return
+            yield from _shift(decls, loc)
+
+    def _parallel(self, s: str):
+        from concurrent.futures import ProcessPoolExecutor
+        from pyparsing import ParseBaseException
+
+        chunks = [(loc, text, self.engine) for loc, text in lexer.chunks(s)]
+        if len(chunks) < self.min_chunks:
+            return s | Parser(engine=self.engine)
+        size = max(1, len(chunks) // (self.jobs * 4))
+        try:
+            with ProcessPoolExecutor(self.jobs) as pool:
+                results = list(pool.map(_parse_chunk, chunks, chunksize=size))
+        except ParseBaseException:
+            return s | Parser(engine=self.engine)
+        return [d for ds in results for d in renumber(ds)]
+
+
+def _parse_chunk(chunk: tuple[int, str, str]):
+    loc, text, engine = chunk
+    return list(_shift(text | Parser(engine=engine), loc))
+
+
+def _shift(decls, loc: int):
+    return (relocate(d, loc) for d in decls) if loc else decls
+
+
+def remap(x, f):
+    if isinstance(x, list):
+        return [remap(y, f) for y in x]
+    if isinstance(x, tuple):
+        return tuple(remap(y, f) for y in x)
+    if not is_dataclass(x) or isinstance(x, Name):
+        return f(x)
+    xs = {i.name: remap(getattr(x, i.name), f) for i in fields(x) if i.init}
+    return f(replace(x, **xs))
+
+
+def relocate(x, offset: int):
+    return remap(
+        x,
+        lambda n: (
+            replace(n, loc=n.loc + offset, end=n.end + offset)
+            if hasattr(n, "loc")
+            else n
+        ),
+    )
+
+
+def renumber(x):
+    ids = {}
+
+    def f(n):
+        if isinstance(n, Name) or isinstance(n, Instance):
+            if n.id not in ids:
+                ids[n.id] = fresh()
+            return replace(n, id=ids[n.id])
+        return n
 
-_g.expr.add_parse_action(_infix)
-_g.type_.add_parse_action(lambda l, r: Type(l))
-_g.ph.add_parse_action(lambda l, r: Placeholder(l, True))
-_g.ref.add_parse_action(lambda l, r: Ref(l, r[0][0]))
-_g.i_param.add_parse_action(lambda r: Param(r[0], r[1], True))
-_g.e_param.add_parse_action(lambda r: Param(r[0], r[1], False))
-_g.c_param.add_parse_action(lambda r: Param(r[0], r[1], True, True))
-_g.fn_type.add_parse_action(lambda l, r: FnType(l, r[0], r[1]))
-_g.fn.add_parse_action(
-    lambda l, r: reduce(lambda a, n: Fn(l, n, a), reversed(r[0]), r[1])
-)
-_g.match.add_parse_action(lambda l, r: Match(l, r[0], list(r[1])))
-_g.case.add_parse_action(lambda r: Case(r[0].loc, r[0], r[1], r[2]))
-_g.nomatch.add_parse_action(lambda l, r: Nomatch(l, r[0][0]))
-_g.i_arg.add_parse_action(lambda l, r: (r[1], r[0]))
-_g.e_arg.add_parse_action(lambda l, r: (r[0], False))
-_g.call.add_parse_action(
-    lambda l, r: reduce(lambda a, b: Call(l, a, b[0], b[1]), r[1:], r[0])
-)
-_g.p_expr.add_parse_action(lambda r: r[0])
-
-_g.return_type.add_parse_action(lambda l, r: r[0] if len(r) else Placeholder(l, False))
-_g.def_.add_parse_action(lambda r: Def(r[0].loc, r[0].name, list(r[1]), r[2], r[3]))
-_g.example.add_parse_action(lambda l, r: Example(l, list(r[0]), r[1], r[2]))
-_g.type_arg.add_parse_action(lambda r: (r[0], r[1]))
-_g.ctor.add_parse_action(lambda r: Ctor(r[0].loc, r[0].name, list(r[1]), list(r[2])))
-_g.data.add_condition(
-    lambda r: r[0].name.text == r[3], message="open and datatype name mismatch"
-).add_parse_action(lambda r: Data(r[0].loc, r[0].name, list(r[1]), list(r[2])))
-_g.c_field.add_parse_action(lambda l, r: Field(l, r[0], r[1]))
-_g.class_.add_condition(
-    lambda r: r[0].name.text == r[3], message="open and class name mismatch"
-).add_parse_action(lambda r: Class(r[0].loc, r[0].name, list(r[1]), list(r[2])))
-_g.i_field.add_parse_action(lambda r: (r[0], r[1]))
-_g.inst.add_parse_action(lambda l, r: Instance(l, r[0], list(r[1])))
+    return remap(x, f)
 
 
 @dataclass(frozen=True)
-class Parser:
+class IncrementalParser:
+    engine: str = "pyparsing"
+    chunks: dict[str, tuple[int, list[Decl]]] = field(default_factory=dict)
+
+    def __ror__(self, s: str):
+        from pyparsing import ParseBaseException
+
+        p = Parser(engine=self.engine)
+        old = self.chunks.copy()
+        self.chunks.clear()
+        ret = []
+        for loc, text in lexer.chunks(s):
+            if text in self.chunks or text not in old:
+                try:
+                    decls = text | p
+                except ParseBaseException:
+                    self.chunks.clear()
+                    return s | p
+                if loc:
+                    decls = relocate(decls, loc)
+            else:
+                prev, decls = old.pop(text)
+                if prev != loc:
+                    decls = relocate(decls, loc - prev)
+            self.chunks.setdefault(text, (loc, decls))
+            ret.extend(decls)
+        return ret
+
+
+@dataclass(frozen=True)
+class RecoveringParser:
     is_markdown: bool = False
+    engine: str = "pyparsing"
+    errors: list[Exception] = field(default_factory=list)
 
     def __ror__(self, s: str):
+        return list(self.stream(s))
+
+    def stream(self, s):
+        self.errors.clear()
         if not self.is_markdown:
-            return list(_g.program.parse_string(s, parse_all=True))
-        return chain.from_iterable(r[0] for r in _g.markdown.scan_string(s))
+            return self._recover(s, s, 0)
+        return (
+            d
+            for loc, text in lexer.fences(s)
+            for d in _shift(self._recover(text, s, loc), loc)
+        )
+
+    def _recover(self, text: str, s, offset: int):
+        for loc, chunk in lexer.chunks(text):
+            yield from _shift(self._chunk(chunk, s, offset + loc), loc)
+
+    def _chunk(self, text: str, s, offset: int):
+        from pyparsing import ParseBaseException
+
+        p = Parser(engine=self.engine)
+        tokens = lexer.tokenize(text)
+        pos = 0
+        while pos is not None:
+            done = pos
+            try:
+                for d in _shift(p.stream(text[pos:]), pos):
+                    done = d.end
+                    yield d
+                return
+            except ParseBaseException as e:
+                loc = e.loc + pos
+                full = s if isinstance(s, str) else s[:].decode()
+                self.errors.append(type(e)(full, loc + offset, e.msg))
+            pos = lexer.resync(tokens, done, loc)
 
 
 class DuplicateVariableError(Exception): ...
@@ -144,15 +352,117 @@ class DuplicateVariableError(Exception): ...
 class UndefinedVariableError(Exception): ...
 
 
+def decl_id(d: Decl):
+    if isinstance(d, Instance):
+        return d.id
+    if isinstance(d, Example):
+        return None
+    return _c(Def, d).name.id
+
+
+@dataclass(frozen=True)
+class DependencyGraph:
+    deps: dict[int, set[int]] = field(default_factory=dict)
+    users: dict[int, set[int]] = field(default_factory=dict)
+    owners: dict[int, int] = field(default_factory=dict)
+    instances: dict[int, list[int]] = field(default_factory=dict)
+    ids: dict[str, int] = field(default_factory=dict)
+
+    @classmethod
+    def of(cls, decls: list[Decl]):
+        g = cls()
+        for d in decls:
+            g.add(d)
+        return g
+
+    def add(self, d: Decl):
+        i = decl_id(d)
+        if i is None:
+            return
+        if isinstance(d, Data):
+            self.owners.update((c.name.id, i) for c in d.ctors)
+            self.ids.update((c.name.text, c.name.id) for c in d.ctors)
+        elif isinstance(d, Class):
+            self.owners.update((f.name.id, i) for f in d.fields)
+            self.ids.update((f.name.text, f.name.id) for f in d.fields)
+        elif isinstance(d, Instance):
+            head = d.type
+            while isinstance(head, Call):
+                head = head.callee
+            if isinstance(head, Ref):
+                c = self.owner(head.name.id)
+                self.instances.setdefault(c, []).append(i)
+        if not isinstance(d, Instance):
+            self.ids[d.name.text] = i
+        refs = set()
+        _refs(d, refs)
+        deps = {self.owner(r) for r in refs if r in self.deps or r in self.owners}
+        deps.discard(i)
+        self.deps[i] = deps
+        for j in deps:
+            self.users.setdefault(j, set()).add(i)
+
+    def owner(self, i: int):
+        return self.owners.get(i, i)
+
+    def dependencies(self, i: int):
+        owner = self.owner(i)
+        ds = self._closure(owner, self.deps, True)
+        return ds | {owner} if owner != i else ds
+
+    def dependents(self, i: int):
+        return self._closure(self.owner(i), self.users, False)
+
+    def only(self, decls: list[Decl], name: str):
+        if name not in self.ids:
+            raise UndefinedVariableError(name, 0)
+        i = self.owner(self.ids[name])
+        keep = self.dependencies(i) | {i}
+        return [d for d in decls if decl_id(d) in keep]
+
+    def _closure(self, i: int, edges: dict[int, set[int]], with_instances: bool):
+        seen, todo = set(), [i]
+        while todo:
+            j = todo.pop()
+            ks = edges.get(j, set())
+            if with_instances:
+                ks = ks.union(self.instances.get(j, ()))
+            for k in ks - seen:
+                seen.add(k)
+                todo.append(k)
+        seen.discard(i)
+        return seen
+
+
+def _refs(x, out: set[int]):
+    if isinstance(x, Ref):
+        out.add(x.name.id)
+    elif isinstance(x, list) or isinstance(x, tuple):
+        for y in x:
+            _refs(y, out)
+    elif is_dataclass(x) and not isinstance(x, Name):
+        for f in fields(x):
+            _refs(getattr(x, f.name), out)
+
+
 @dataclass(frozen=True)
 class NameResolver:
     locals: dict[str, Name] = field(default_factory=dict)
     globals: dict[str, Name] = field(default_factory=dict)
+    graph: DependencyGraph = field(default_factory=DependencyGraph)
 
     def __ror__(self, decls: list[Decl]):
-        return [self._decl(d) for d in decls]
+        return list(self.stream(decls))
+
+    def stream(self, decls):
+        return map(self._decl, decls)
 
     def _decl(self, decl: Decl) -> Decl:
+        d = self._resolve(decl)
+        self.graph.add(d)
+        return d
+
+    def _resolve(self, decl: Decl) -> Decl:
         self.locals.clear()
 
         if isinstance(decl, Def) or isinstance(decl, Data):
@@ -174,13 +484,13 @@ class NameResolver:
         ret = self.expr(d.ret)
         body = self.expr(d.body)
         if isinstance(d, Example):
-            return Example(d.loc, params, ret, body)
-        return Def(d.loc, d.name, params, ret, body)
+            return Example(d.loc, params, ret, body, end=d.end)
+        return Def(d.loc, d.name, params, ret, body, end=d.end)
 
     def _data(self, d: Data[Node]):
         params = self._params(d.params)
         ctors = [self._ctor(c, d.name) for c in d.ctors]
-        return Data(d.loc, d.name, params, ctors)
+        return Data(d.loc, d.name, params, ctors, end=d.end)
 
     def _ctor(self, c: Ctor[Node], ty_name: Name):
         params = self._params(c.params)
@@ -188,18 +498,19 @@ class NameResolver:
         for p in params:
             del self.locals[p.name.text]
         self._insert_global(c.loc, c.name)
-        return Ctor(c.loc, c.name, params, ty_args, ty_name)
+        return Ctor(c.loc, c.name, params, ty_args, ty_name, end=c.end)
 
     def _class(self, c: Class[Node]):
         params = self._params(c.params)
         fields = []
         for f in c.fields:
             self._insert_global(f.loc, f.name)
-            fields.append(Field(f.loc, f.name, self.expr(f.type)))
+            fields.append(Field(f.loc, f.name, self.expr(f.type), end=f.end))
         self._insert_global(c.loc, c.name)
-        return Class(c.loc, c.name, params, fields)
+        return Class(c.loc, c.name, params, fields, end=c.end)
 
     def _inst(self, i: Instance[Node]):
+        params = self._params(i.params)
         t = self.expr(i.type)
         fields = []
         field_ids = set()
@@ -209,7 +520,7 @@ class NameResolver:
                 raise DuplicateVariableError(n.name.text, n.loc)
             field_ids.add(n.name.id)
             fields.append((n, (self.expr(v))))
-        return Instance(i.loc, t, fields)
+        return Instance(i.loc, t, fields, params=params, end=i.end)
 
     def _params(self, params: list[Param[Node]]):
         ret = []
@@ -221,27 +532,28 @@ class NameResolver:
     def expr(self, n: Node) -> Node:
         if isinstance(n, Ref):
             if v := self.locals.get(n.name.text, self.globals.get(n.name.text)):
-                return Ref(n.loc, v)
+                return Ref(n.loc, v, end=n.end)
             raise UndefinedVariableError(n.name.text, n.loc)
         if isinstance(n, FnType):
             typ = self.expr(n.param.type)
             b = self._with_locals(n.ret, n.param.name)
             p = Param(n.param.name, typ, n.param.is_implicit, n.param.is_class)
-            return FnType(n.loc, p, b)
+            return FnType(n.loc, p, b, end=n.end)
         if isinstance(n, Fn):
-            return Fn(n.loc, n.param, self._with_locals(n.body, n.param))
+            return Fn(n.loc, n.param, self._with_locals(n.body, n.param), end=n.end)
         if isinstance(n, Call):
-            return Call(n.loc, self.expr(n.callee), self.expr(n.arg), n.implicit)
+            callee, arg = self.expr(n.callee), self.expr(n.arg)
+            return Call(n.loc, callee, arg, n.implicit, end=n.end)
         if isinstance(n, Nomatch):
-            return Nomatch(n.loc, self.expr(n.arg))
+            return Nomatch(n.loc, self.expr(n.arg), end=n.end)
         if isinstance(n, Match):
             arg = self.expr(n.arg)
             cases = []
             for c in n.cases:
                 ctor = _c(Ref, self.expr(c.ctor))
                 body = self._with_locals(c.body, *c.params)
-                cases.append(Case(c.loc, ctor, c.params, body))
-            return Match(n.loc, arg, cases)
+                cases.append(Case(c.loc, ctor, c.params, body, end=c.end))
+            return Match(n.loc, arg, cases, end=n.end)
         assert isinstance(n, Type) or isinstance(n, Placeholder)
         return n
 
@@ -293,15 +605,34 @@ class FieldMissError(Exception): ...
 class UnknownFieldError(Exception): ...
 
 
-@dataclass(frozen=True)
+ENGINE = "TINYLEAN_ENGINE"
+ENGINES = ("ir", "nbe")
+
+
+@cache
+def load_engine(name: str):
+    if name == "nbe":
+        from . import nbe
+
+        return nbe
+    assert name == "ir"
+    return ir
+
+
+@dataclass
 class TypeChecker:
-    globals: dict[int, Decl] = field(default_factory=dict)
+    globals: ir.Globals = field(default_factory=ir.Globals)
+    ctx: ir.Context = field(default_factory=ir.Context)
     locals: dict[int, Param[ir.IR]] = field(default_factory=dict)
-    holes: OrderedDict[int, ir.Hole] = field(default_factory=OrderedDict)
+    holes: ir.Holes = field(default_factory=ir.Holes)
     recur_ids: set[int] = field(default_factory=set)
+    engine: str = field(default_factory=lambda: os.environ.get(ENGINE, "ir"))
 
     def __ror__(self, ds: list[Decl]):
-        ret = [self._run(d) for d in ds]
+        return list(self.stream(ds))
+
+    def stream(self, ds):
+        yield from map(self._run, ds)
         for i, h in self.holes.items():
             if h.answer.is_unsolved():
                 ty = self._inliner().run(h.answer.type)
@@ -309,9 +640,9 @@ class TypeChecker:
                     continue
                 p = ir.Placeholder(i, h.is_user)
                 raise UnsolvedPlaceholderError(str(p), h.locals, ty, h.loc)
-        return ret
 
     def _run(self, decl: Decl) -> Decl:
+        self.ctx = ir.Context()
         self.locals.clear()
         if isinstance(decl, Def) or isinstance(decl, Example):
             return self._def_or_example(decl)
@@ -322,23 +653,31 @@ class TypeChecker:
         return self._class(_c(Class, decl))
 
     def _def_or_example(self, d: Def[Node] | Example[Node]):
+        stamp = self.holes.stamp()
         params = self._params(d.params)
-        ret = self.check(d.ret, ir.Type())
+        ret = ir.cons.run(self.check(d.ret, ir.Type()))
 
         if isinstance(d, Def):
-            self.globals[d.name.id] = Sig(d.loc, d.name, params, ret)
+            self.globals[d.name.id] = Sig(d.loc, d.name, params, ret, end=d.end)
         body = self.check(d.body, ret)
+        height = ir.height(self.globals, body)
+        body = ir.cons.run(self._unfold(body))
 
         if isinstance(d, Example):
-            return Example(d.loc, params, ret, body)
-
-        checked = Def(d.loc, d.name, params, ret, body)
+            return Example(d.loc, params, ret, body, end=d.end)
+
+        if self.holes.stamp() != stamp:
+            params = [self._zonk_param(p) for p in params]
+            ret, body = self._zonk(ret), self._zonk(body)
+        checked = Def(d.loc, d.name, params, ret, body, end=d.end)
+        self.globals.cached(checked, ("is_type",), lambda: self._returns_type(ret))
+        self.globals.cached(checked, ("height",), lambda: height)
         self.globals[d.name.id] = checked
         return checked
 
     def _data(self, d: Data[Node]):
         params = self._params(d.params)
-        data = Data(d.loc, d.name, params, [])
+        data = Data(d.loc, d.name, params, [], end=d.end)
         self.globals[d.name.id] = data
         data.ctors.extend(self._ctor(c) for c in d.ctors)
         return data
@@ -349,24 +688,31 @@ class TypeChecker:
         for x, v in c.ty_args:
             x_val, x_ty = self.infer(x)
             v_val = self.check(v, x_ty)
-            ty_args.append((x_val, v_val))
-        ctor = Ctor(c.loc, c.name, params, ty_args, c.ty_name)
+            ty_args.append((ir.cons.run(x_val), ir.cons.run(v_val)))
+        ctor = Ctor(c.loc, c.name, params, ty_args, c.ty_name, end=c.end)
         self.globals[c.name.id] = ctor
         return ctor
 
     def _class(self, c: Class[Node]):
         params = self._params(c.params)
         fs = [
-            Field(f.loc, f.name, self.check(f.type, ir.Type()), c.name)
+            Field(
+                f.loc,
+                f.name,
+                ir.cons.run(self.check(f.type, ir.Type())),
+                c.name,
+                end=f.end,
+            )
             for f in c.fields
         ]
         self.globals.update({f.name.id: f for f in fs})
-        cls = Class(c.loc, c.name, params, fs)
+        cls = Class(c.loc, c.name, params, fs, end=c.end)
         self.globals[c.name.id] = cls
         return cls
 
     def _inst(self, i: Instance[Node]):
-        ty = self.check(i.type, ir.Type())
+        params = self._params(i.params)
+        ty = ir.cons.run(self.check(i.type, ir.Type()))
         if not isinstance(ty, ir.Class):
             raise TypeMismatchError("class", str(ty), i.type.loc)
         c = _c(Class, self.globals[ty.name.id])
@@ -378,19 +724,20 @@ class TypeChecker:
                 raise FieldMissError(f.name.text, i.loc)
             _, v = nv
             f_decl = _c(Field, self.globals[f.name.id])
-            field_ty = ir.from_field(f_decl, c, False)[1]
+            field_ty = ir.from_field(self.globals, f_decl, c, False)[1]
             env = []
             for ty_arg in ty.args:
                 assert isinstance(field_ty, ir.FnType)
                 env.append((field_ty.param.name, ty_arg))
                 field_ty = field_ty.ret
             f_type = self._inliner().run_with(field_ty, *env)
-            fields.append((ir.Ref(f.name), self.check(nv[1], f_type)))
+            fields.append((ir.Ref(f.name), ir.cons.run(self.check(nv[1], f_type))))
         for n, _ in vals.values():
             assert isinstance(n, Ref)
             raise UnknownFieldError(c.name.text, n.name.text, n.loc)
         c.instances.append(i.id)
-        inst = Instance(i.loc, _c(ir.IR, ty), fields, i.id)
+        ir.add_instance(self.globals, c, i.id, _c(ir.Class, self._inliner().run(ty)))
+        inst = Instance(i.loc, _c(ir.IR, ty), fields, i.id, params, end=i.end)
         self.globals[i.id] = inst
         return inst
 
@@ -403,14 +750,14 @@ class TypeChecker:
                 assert p.is_implicit
                 if not isinstance(t, ir.Class):
                     raise TypeMismatchError("class", str(t), p.type.loc)
-            param = Param(p.name, t, p.is_implicit, p.is_class)
-            self.locals[p.name.id] = param
+            param = Param(p.name, ir.cons.run(t), p.is_implicit, p.is_class)
+            self._push(param)
             ret.append(param)
         return ret
 
     def check(self, n: Node, typ: ir.IR) -> ir.IR:
         if isinstance(n, Fn):
-            t = self._inliner().run(typ)
+            t = self._inliner().whnf(typ)
             if not isinstance(t, ir.FnType):
                 raise TypeMismatchError(str(t), "function", n.loc)
             ret = self._inliner().run_with(t.ret, (t.param.name, ir.Ref(n.param)))
@@ -419,8 +766,8 @@ class TypeChecker:
 
         holes_len = len(self.holes)
         val, got = self.infer(n)
-        got = self._inliner().run(got)
-        want = self._inliner().run(typ)
+        got = self._inliner().whnf(got)
+        want = self._inliner().whnf(typ)
 
         if _can_insert_placeholders(want):
             if new_f := _with_placeholders(n, got, False):
@@ -435,22 +782,28 @@ class TypeChecker:
 
     def infer(self, n: Node) -> tuple[ir.IR, ir.IR]:
         if isinstance(n, Ref):
-            if param := self.locals.get(n.name.id):
+            d = self.globals.get(n.name.id)
+            if d is None:
+                param = self.locals[n.name.id]
                 return ir.Ref(param.name), param.type
-            d = self.globals[n.name.id]
             if isinstance(d, Def):
-                return ir.from_def(d)
+                is_type = lambda: self._returns_type(d.ret)
+                if self.globals.cached(d, ("is_type",), is_type):
+                    return ir.from_def(self.globals, d)
+                return ir.Global(d.name), ir.def_type(self.globals, d)
             if isinstance(d, Sig):
                 self.recur_ids.add(d.name.id)
                 return ir.from_sig(d)
             if isinstance(d, Data):
-                return ir.from_data(d)
+                return ir.from_data(self.globals, d)
             if isinstance(d, Ctor):
                 data_decl = _c(Data, self.globals[d.ty_name.id])
-                return ir.from_ctor(d, data_decl)
+                return ir.from_ctor(self.globals, d, data_decl)
             if isinstance(d, Field):
-                return ir.from_field(d, _c(Class, self.globals[d.cls_name.id]))
-            return ir.from_class(_c(Class, d))
+                return ir.from_field(
+                    self.globals, d, _c(Class, self.globals[d.cls_name.id])
+                )
+            return ir.from_class(self.globals, _c(Class, d))
         if isinstance(n, FnType):
             p_typ = self.check(n.param.type, ir.Type())
             p = Param(n.param.name, p_typ, n.param.is_implicit, n.param.is_class)
@@ -462,7 +815,8 @@ class TypeChecker:
 
             if implicit_f := _with_placeholders(n.callee, got, n.implicit):
                 [self.holes.popitem() for _ in range(len(self.holes) - holes_len)]
-                return self.infer(Call(n.loc, implicit_f, n.arg, n.implicit))
+                call = Call(n.loc, implicit_f, n.arg, n.implicit, end=n.end)
+                return self.infer(call)
 
             if not isinstance(got, ir.FnType):
                 raise TypeMismatchError("function", str(got), n.callee.loc)
@@ -516,30 +870,63 @@ class TypeChecker:
         return ir.Type(), ir.Type()
 
     def _inliner(self):
-        return ir.Inliner(self.holes, self.globals)
+        return load_engine(self.engine).Inliner(self.holes, self.globals)
 
     def _eq(self, got: ir.IR, want: ir.IR):
-        return ir.Converter(self.holes, self.globals).eq(got, want)
+        c = load_engine(self.engine).Converter(self.holes, self.globals)
+        return self.globals.memo.eq(c, got, want)
+
+    def _unfold(self, v: ir.IR):
+        return ir.unfold(self._inliner(), v)
+
+    def _zonk(self, v: ir.IR):
+        z = ir.zonk(ir.Inliner(self.holes, self.globals), v)
+        return v if z is v else ir.cons.run(z)
+
+    def _zonk_param(self, p: Param[ir.IR]):
+        t = self._zonk(p.type)
+        return p if t is p.type else Param(p.name, t, p.is_implicit, p.is_class)
+
+    def _returns_type(self, ret: ir.IR):
+        ty = self._inliner().run(ret)
+        while isinstance(ty, ir.FnType):
+            ty = ty.ret
+        return isinstance(ty, ir.Type)
 
     def _check_with(self, n: Node, typ: ir.IR, *ps: Param[ir.IR]):
-        self.locals.update({p.name.id: p for p in ps})
+        scope = self._push(*ps)
         ret = self.check(n, typ)
-        [self.locals.pop(p.name.id, None) for p in ps]
+        self._pop(scope)
         return ret
 
     def _infer_with(self, n: Node, *ps: Param[ir.IR]):
-        self.locals.update({p.name.id: p for p in ps})
+        scope = self._push(*ps)
         v, ty = self.infer(n)
-        [self.locals.pop(p.name.id, None) for p in ps]
+        self._pop(scope)
         return v, ty
 
+    def _push(self, *ps: Param[ir.IR]):
+        old = self.ctx, [(p.name.id, self.locals.get(p.name.id)) for p in ps]
+        for p in ps:
+            self.ctx = self.ctx.push(p)
+            self.locals[p.name.id] = p
+        return old
+
+    def _pop(self, scope: tuple[ir.Context, list[tuple[int, Optional[Param]]]]):
+        self.ctx, old = scope
+        for i, p in reversed(old):
+            if p is None:
+                del self.locals[i]
+            else:
+                self.locals[i] = p
+
     def _insert_hole(self, loc: int, is_user: bool, typ: ir.IR):
         i = fresh()
-        self.holes[i] = ir.Hole(loc, is_user, self.locals.copy(), ir.Answer(typ))
+        self.holes[i] = ir.Hole(loc, is_user, self.ctx, ir.Answer(typ))
         return ir.Placeholder(i, is_user)
 
     def _ctor_return_type(self, loc: int, c: Ctor[ir.IR], d: Data[ir.IR]):
-        _, ty = ir.from_ctor(c, d)
+        _, ty = ir.from_ctor(self.globals, c, d)
         while isinstance(ty, ir.FnType):
             p = ty.param
             x = (
@@ -593,7 +980,18 @@ def _with_placeholders(f: Node, f_ty: ir.IR, implicit: str | bool) -> Node | Non
 
 
 def _call_placeholder(f: Node):
-    return Call(f.loc, f, Placeholder(f.loc, False), True)
+    return Call(f.loc, f, Placeholder(f.loc, False, end=f.end), True, end=f.end)
 
 
 check_string = lambda s, md=False: s | Parser(md) | NameResolver() | TypeChecker()
+
+
+def check_only(s: str, name: str, md=False):
+    r = NameResolver()
+    decls = s | Parser(md) | r
+    return r.graph.only(decls, name) | TypeChecker()
+
+
+def check_stream(s: str, md=False, engine="pyparsing"):
+    decls = Parser(md, engine).stream(s)
+    return TypeChecker().stream(NameResolver().stream(decls))
@@ -0,0 +1,79 @@
+import os
+import pickle
+from dataclasses import dataclass
+from functools import cache
+from hashlib import sha256
+from pathlib import Path
+
+from . import ast
+
+ENV = "TINYLEAN_CACHE"
+SCHEMA = 2  # bump whenever a pickled AST or IR dataclass changes shape
+
+
+@cache
+def package_version():
+    from importlib.metadata import version, PackageNotFoundError
+
+    try:
+        return version("TinyLean")
+    except PackageNotFoundError:
+        return "dev"
+
+
+@dataclass(frozen=True)
+class Cache:
+    path: Path
+    is_markdown: bool = False
+    max_bytes: int = 64 << 20
+
+    def __ror__(self, s: str):
+        f = self.path / f"{self.key(s)}.pickle"
+        try:
+            with open(f, "rb") as fp:
+                decls = pickle.load(fp)
+            os.utime(f)
+            return ast.renumber(decls)
+        except FileNotFoundError:
+            pass
+        except Exception:
+            f.unlink(missing_ok=True)
+        decls = s | ast.Parser(self.is_markdown) | ast.NameResolver()
+        self._store(f, decls)
+        return decls
+
+    def key(self, s: str):
+        h = sha256(f"{package_version()}\0{SCHEMA}\0{self.is_markdown}\0".encode())
+        h.update(s.encode())
+        return h.hexdigest()
+
+    def _store(self, f: Path, decls: list):
+        tmp = f.with_suffix(f".{os.getpid()}.tmp")
+        try:
+            self.path.mkdir(parents=True, exist_ok=True)
+            with open(tmp, "wb") as fp:
+                pickle.dump(decls, fp, pickle.HIGHEST_PROTOCOL)
+            os.replace(tmp, f)
+            self._evict()
+        except (OSError, RecursionError, pickle.PicklingError):
+            tmp.unlink(missing_ok=True)
+
+    def _evict(self):
+        entries = []
+        for f in self.path.glob("*.pickle"):
+            try:
+                st = f.stat()
+            except FileNotFoundError:
+                continue
+            entries.append((st.st_mtime_ns, st.st_size, f))
+        total = sum(size for _, size, _ in entries)
+        for _, size, f in sorted(entries)[:-1]:
+            if total <= self.max_bytes:
+                break
+            f.unlink(missing_ok=True)
+            total -= size
+
+
+def from_env(is_markdown=False):
+    path = os.environ.get(ENV)
+    return Cache(Path(path), is_markdown) if path else None
@@ -1,9 +1,12 @@
 from contextlib import contextmanager
 from dataclasses import dataclass, field
-from functools import reduce as _r
+from functools import reduce as _r, wraps
+from heapq import merge
 from typing import Optional, cast as _c, OrderedDict
+from weakref import WeakValueDictionary
 
 from . import (
+    fresh,
     Name,
     Param,
     Def,
@@ -18,7 +21,12 @@ from . import (
 
 
 @dataclass(frozen=True)
-class IR: ...
+class IR:
+    fp: Optional[int] = field(default=None, init=False, repr=False, compare=False)
+
+
+def _freeze(v: IR, name: str):
+    object.__setattr__(v, name, tuple(getattr(v, name)))
 
 
 @dataclass(frozen=True)
@@ -75,7 +83,10 @@ class Placeholder(IR):
 @dataclass(frozen=True)
 class Data(IR):
     name: Name
-    args: list[IR]
+    args: tuple[IR, ...]
+
+    def __post_init__(self):
+        _freeze(self, "args")
 
     def __str__(self):
         s = " ".join(str(x) for x in [self.name, *self.args])
@@ -86,7 +97,10 @@ class Data(IR):
 class Ctor(IR):
     ty_name: Name
     name: Name
-    args: list[IR]
+    args: tuple[IR, ...]
+
+    def __post_init__(self):
+        _freeze(self, "args")
 
     def __str__(self):
         n = f"{self.ty_name}.{self.name}"
@@ -103,9 +117,12 @@ class Nomatch(IR):
 @dataclass(frozen=True)
 class Case(IR):
     ctor: Name
-    params: list[Param[IR]]
+    params: tuple[Param[IR], ...]
     body: IR
 
+    def __post_init__(self):
+        _freeze(self, "params")
+
     def __str__(self):
         s = " ".join([str(self.ctor), *map(str, self.params)])
         return f"| {s} ↦ {self.body}"
@@ -129,10 +146,21 @@ class Recur(IR):
         return str(self.name)
 
 
+@dataclass(frozen=True)
+class Global(IR):
+    name: Name
+
+    def __str__(self):
+        return str(self.name)
+
+
 @dataclass(frozen=True)
 class Class(IR):
     name: Name
-    args: list[IR]
+    args: tuple[IR, ...]
+
+    def __post_init__(self):
+        _freeze(self, "args")
 
     def __str__(self):
         s = " ".join(str(x) for x in [self.name, *self.args])
@@ -153,23 +181,28 @@ class Field(IR):
 
 @dataclass(frozen=True)
 class Renamer:
-    locals: dict[int, int] = field(default_factory=dict)
+    locals: dict[int, Name] = field(default_factory=dict)
 
     def run(self, v: IR) -> IR:
+        if v.fp is not None:
+            return v
         if isinstance(v, Ref):
-            if v.name.id in self.locals:
-                return Ref(Name(v.name.text, self.locals[v.name.id]))
+            if name := self.locals.get(v.name.id):
+                return Ref(name)
             return v
         if isinstance(v, Call):
-            return Call(self.run(v.callee), self.run(v.arg))
+            f, x = self.run(v.callee), self.run(v.arg)
+            return v if f is v.callee and x is v.arg else Call(f, x)
         if isinstance(v, Fn):
             return Fn(self._param(v.param), self.run(v.body))
         if isinstance(v, FnType):
             return FnType(self._param(v.param), self.run(v.ret))
         if isinstance(v, Data):
-            return Data(v.name, [self.run(x) for x in v.args])
+            xs = [self.run(x) for x in v.args]
+            return v if _same(xs, v.args) else Data(v.name, xs)
         if isinstance(v, Ctor):
-            return Ctor(v.ty_name, v.name, [self.run(x) for x in v.args])
+            xs = [self.run(x) for x in v.args]
+            return v if _same(xs, v.args) else Ctor(v.ty_name, v.name, xs)
         if isinstance(v, Match):
             arg = self.run(v.arg)
             cases = {
@@ -178,38 +211,139 @@ class Renamer:
             }
             return Match(arg, cases)
         if isinstance(v, Class):
-            return Class(v.name, [self.run(x) for x in v.args])
+            xs = [self.run(x) for x in v.args]
+            return v if _same(xs, v.args) else Class(v.name, xs)
         if isinstance(v, Field):
-            return Field(v.name, self.run(v.type))
-        assert any(isinstance(v, c) for c in (Type, Placeholder, Nomatch, Recur))
+            t = self.run(v.type)
+            return v if t is v.type else Field(v.name, t)
+        assert any(
+            isinstance(v, c) for c in (Type, Placeholder, Nomatch, Recur, Global)
+        )
         return v
 
     def _param(self, p: Param[IR]):
         name = Name(p.name.text)
-        self.locals[p.name.id] = name.id
+        self.locals[p.name.id] = name
         return Param(name, self.run(p.type), p.is_implicit, p.is_class)
 
 
 _rn = lambda v: Renamer().run(v)
+_same = lambda xs, ys: all(x is y for x, y in zip(xs, ys))
+
+
+@dataclass
+class HashCons:
+    nodes: WeakValueDictionary[int, IR] = field(default_factory=WeakValueDictionary)
+    hits: int = 0
+
+    def run(self, v: IR) -> IR:
+        if v.fp is not None:
+            return v
+        if isinstance(v, Call):
+            f, x = self.run(v.callee), self.run(v.arg)
+            u = v if f is v.callee and x is v.arg else Call(f, x)
+            return self._cons(u, (), (f, x))
+        if isinstance(v, Data) or isinstance(v, Class):
+            xs = [self.run(x) for x in v.args]
+            u = v if _same(xs, v.args) else type(v)(v.name, xs)
+            return self._cons(u, (v.name.id,), u.args)
+        if isinstance(v, Ctor):
+            xs = [self.run(x) for x in v.args]
+            u = v if _same(xs, v.args) else Ctor(v.ty_name, v.name, xs)
+            return self._cons(u, (v.ty_name.id, v.name.id), u.args)
+        if isinstance(v, Fn):
+            p, b = self._param(v.param), self.run(v.body)
+            return v if p is v.param and b is v.body else Fn(p, b)
+        if isinstance(v, FnType):
+            p, b = self._param(v.param), self.run(v.ret)
+            return v if p is v.param and b is v.ret else FnType(p, b)
+        if isinstance(v, Type):
+            return self._cons(v, (), ())
+        return v
+
+    def _param(self, p: Param[IR]):
+        t = self.run(p.type)
+        return p if t is p.type else Param(p.name, t, p.is_implicit, p.is_class)
+
+    def _cons(self, v: IR, data: tuple, children: tuple[IR, ...]):
+        if any(c.fp is None for c in children):
+            return v
+        h = hash((type(v), *data, *(c.fp for c in children)))
+        if (old := self.nodes.get(h)) is not None:
+            if old != v:
+                return v
+            self.hits += 1
+            return old
+        object.__setattr__(v, "fp", fresh())
+        self.nodes[h] = v
+        return v
+
+
+cons = HashCons()
 
 
 def _to(p: list[Param[IR]], v: IR, t=False):
     return _r(lambda a, q: _c(IR, FnType(q, a) if t else Fn(q, a)), reversed(p), v)
 
 
-def from_def(d: Def[IR]):
-    return _rn(_to(d.params, d.body)), _rn(_to(d.params, d.ret, True))
+class Globals(dict[int, Decl]):
+    def __init__(self, *args):
+        super().__init__(*args)
+        self.elaborated: dict[int, tuple[Decl, dict[tuple, object]]] = {}
+        self.generation = 0
+        self.tabling = Tabling()
+        self.memo = ConvCache()
+
+    def cached(self, d: Decl, key: tuple, make):
+        i = d.id if isinstance(d, Instance) else d.name.id
+        if (e := self.elaborated.get(i)) is None or e[0] is not d:
+            e = self.elaborated[i] = d, {}
+        if (v := e[1].get(key)) is None:
+            v = e[1][key] = make()
+        return v
+
+
+def _elaborated(f):
+    @wraps(f)
+    def g(globals: Globals, d: Decl, *args):
+        key = (f.__name__, *(a for a in args if isinstance(a, bool)))
+        return globals.cached(d, key, lambda: f(d, *args))
+
+    return g
+
+
+def from_def(globals: Globals, d: Def[IR]):
+    return def_value(globals, d), def_type(globals, d)
+
+
+def def_value(globals: Globals, d: Def[IR]):
+    return globals.cached(d, ("def_value",), lambda: _to(d.params, d.body))
+
+
+def def_type(globals: Globals, d: Def[IR]):
+    return globals.cached(d, ("def_type",), lambda: _to(d.params, d.ret, True))
+
+
+def def_height(globals: Globals, d: Def[IR]) -> int:
+    return globals.cached(d, ("height",), lambda: 0)
+
+
+def height(globals: Globals, v: IR) -> int:
+    hs = (def_height(globals, _c(Def, globals[i])) for i in _globals(v))
+    return 1 + max(hs, default=0)
 
 
 def from_sig(s: Sig[IR]):
     return Recur(s.name), _rn(_to(s.params, s.ret, True))
 
 
+@_elaborated
 def from_data(d: DataDecl[IR]):
     args = [Ref(p.name) for p in d.params]
-    return _rn(_to(d.params, Data(d.name, args))), _rn(_to(d.params, Type(), True))
+    return _to(d.params, Data(d.name, args)), _to(d.params, Type(), True)
 
 
+@_elaborated
 def from_ctor(c: CtorDecl[IR], d: DataDecl[IR]):
     adhoc = {x.name.id: v for x, v in _c(dict[Ref, IR], c.ty_args)}
     miss = [Param(p.name, p.type, True) for p in d.params if p.name.id not in adhoc]
@@ -221,85 +355,308 @@ def from_ctor(c: CtorDecl[IR], d: DataDecl[IR]):
     ty = _to(c.params, Data(d.name, ty_args), True)
     ty = _to(miss, ty, True)
 
-    return _rn(v), _rn(ty)
+    return v, ty
 
 
+@_elaborated
 def from_class(c: ClassDecl[IR]):
     args = [Ref(p.name) for p in c.params]
-    return _rn(_to(c.params, Class(c.name, args))), _rn(_to(c.params, Type(), True))
+    return _to(c.params, Class(c.name, args)), _to(c.params, Type(), True)
 
 
+@_elaborated
 def from_field(f: FieldDecl[IR], c: ClassDecl[IR], has_c_param=True):
     t = Class(c.name, [Ref(p.name) for p in c.params])
     ps = [*c.params, Param(Name("inst"), t, True, True)] if has_c_param else c.params
-    return _rn(_to(ps, Field(f.name, t))), _rn(_to(ps, f.type, True))
+    return _to(ps, Field(f.name, t)), _to(ps, f.type, True)
 
 
 @dataclass
 class Answer:
     type: IR
     value: Optional[IR] = None
+    nf: Optional[IR] = None
+    refs: frozenset[Optional[int]] = frozenset()
+    stamp: tuple[int, int] = (-1, -1)
 
     def is_unsolved(self):
         return self.value is None
 
 
+@dataclass(frozen=True)
+class Context:
+    param: Optional[Param[IR]] = None
+    parent: Optional["Context"] = None
+    size: int = 0
+
+    def __len__(self):
+        return self.size
+
+    def push(self, p: Param[IR]):
+        return Context(p, self, self.size + 1)
+
+    def values(self):
+        ps, c = [], self
+        while c.param:
+            ps.append(c.param)
+            c = _c(Context, c.parent)
+        return reversed(ps)
+
+
 @dataclass(frozen=True)
 class Hole:
     loc: int
     is_user: bool
-    locals: dict[int, Param[IR]]
+    locals: Context
     answer: Answer
 
 
+class Holes(OrderedDict[int, Hole]):
+    def __init__(self, *args):
+        super().__init__(*args)
+        self.trail: list[tuple[Answer, Optional[IR]]] = []
+        self.depth = 0
+        self.epoch = 0
+        self.version = 0
+
+    def solve(self, i: int, v: IR):
+        a = self[i].answer
+        if self.depth:
+            self.trail.append((a, a.value))
+        a.value = v
+        self.version += 1
+
+    def stamp(self):
+        return self.epoch, self.version
+
+    def checkpoint(self):
+        self.depth += 1
+        return len(self), len(self.trail)
+
+    def rollback(self, cp: tuple[int, int]):
+        n, t = cp
+        for a, v in reversed(self.trail[t:]):
+            a.value = v
+        self.epoch += len(self.trail) > t
+        del self.trail[t:]
+        [self.popitem() for _ in range(len(self) - n)]
+        self.depth -= 1
+
+    def commit(self, _: tuple[int, int]):
+        self.depth -= 1
+        if not self.depth:
+            self.trail.clear()
+
+    def attempt(self, f) -> bool:
+        cp = self.checkpoint()
+        try:
+            ok = f()
+        except BaseException:
+            self.rollback(cp)
+            raise
+        self.commit(cp) if ok else self.rollback(cp)
+        return ok
+
+
 @contextmanager
-def dirty_holes(holes: OrderedDict[int, Hole]):
-    l = len(holes)
+def dirty_holes(holes: Holes):
+    cp = holes.checkpoint()
     try:
         yield
     finally:
-        [holes.popitem() for _ in range(len(holes) - l)]
+        holes.rollback(cp)
 
 
 class NoInstanceError(Exception): ...
 
 
+@dataclass
+class InstanceIndex:
+    ids: list[int] = field(default_factory=list)
+    keys: list[tuple] = field(default_factory=list)
+    heads: list[dict[object, list[int]]] = field(default_factory=list)
+    wild: list[list[int]] = field(default_factory=list)
+    resolved: dict[tuple, Optional[Instance[IR]]] = field(default_factory=dict)
+    generation: int = 0
+    pending: dict[tuple, int] = field(default_factory=dict)
+    fields: dict[int, dict[int, IR]] = field(default_factory=dict)
+    hits: int = 0
+
+    def add(self, inst_id: int, c: Class):
+        self.resolved.clear()
+        ks = tuple(map(_head, c.args))
+        if not self.heads:
+            self.heads, self.wild = [{} for _ in ks], [[] for _ in ks]
+        n = len(self.ids)
+        self.ids.append(inst_id)
+        self.keys.append(ks)
+        for k, heads, wild in zip(ks, self.heads, self.wild):
+            (wild if k is None else heads.setdefault(k, [])).append(n)
+
+    def candidates(self, c: Class):
+        ks = tuple(map(_head, c.args))
+        known = [i for i, k in enumerate(ks) if k is not None]
+        if not known or not self.heads:
+            yield from self.ids
+            return
+        size = lambda i: len(self.heads[i].get(ks[i], ())) + len(self.wild[i])
+        i = min(known, key=size)
+        for n in merge(self.heads[i].get(ks[i], []), self.wild[i]):
+            if all(x is None or y is None or x == y for x, y in zip(ks, self.keys[n])):
+                yield self.ids[n]
+
+    def resolve(self, globals: Globals, c: Class, match):
+        t = globals.tabling
+        if self.generation != globals.generation:
+            self.generation = globals.generation
+            self.resolved.clear()
+        k = _key(c, {})
+        if k is not None and k in self.resolved:
+            self.hits += 1
+            return self.resolved[k]
+        if k in self.pending:
+            t.low = min(t.low, self.pending[k])
+            return None
+        if k is not None:
+            self.pending[k] = t.depth
+        low, t.low = t.low, MAX_DEPTH
+        try:
+            for inst_id in self.candidates(c):
+                i = _c(Instance, globals[inst_id])
+                if (ret := match(i)) is not None:
+                    if k is not None and _key(i.type, {}) is not None:
+                        self.resolved[k] = ret
+                    return ret
+            if k is not None and t.low >= t.depth:
+                self.resolved[k] = None
+            return None
+        finally:
+            self.pending.pop(k, None)
+            t.low = min(low, t.low if t.low < t.depth else MAX_DEPTH)
+
+    def field(self, i: Instance[IR], name: Name) -> IR:
+        if (fs := self.fields.get(i.id)) is None:
+            fs = self.fields[i.id] = {_c(Ref, n).name.id: v for n, v in i.fields}
+        return fs[name.id]
+
+
+MAX_DEPTH = 64
+
+
+@dataclass
+class Tabling:
+    depth: int = 0
+    low: int = MAX_DEPTH
+
+
+def instantiate(
+    t: Tabling, holes: Holes, i: Instance[IR], c: Class, run_with, eq, resolve
+):
+    if not i.params:
+        return i if holes.attempt(lambda: eq(c, i.type)) else None
+    if t.depth >= MAX_DEPTH:
+        t.low = -1
+        return None
+    if _key(c, {}) is None:
+        return None
+    n = len(holes)
+    env: list[tuple[Name, Placeholder]] = []
+
+    def match():
+        for p in i.params:
+            if not p.is_class:
+                x = fresh()
+                holes[x] = Hole(i.loc, False, Context(), Answer(run_with(p.type, *env)))
+                env.append((p.name, Placeholder(x, False)))
+        if not eq(c, run_with(i.type, *env)):
+            return False
+        for p in (p for p in i.params if p.is_class):
+            q = run_with(p.type, *env)
+            if _key(q, {}) is None or not resolve(q):
+                return False
+        return not any(holes[x.id].answer.is_unsolved() for _, x in env)
+
+    t.depth += 1
+    try:
+        if not holes.attempt(match):
+            return None
+    finally:
+        t.depth -= 1
+    fields = [(x, cons.run(run_with(v, *env))) for x, v in i.fields]
+    [holes.popitem() for _ in range(len(holes) - n)]
+    return Instance(i.loc, c, fields, end=i.end)
+
+
+def instances(globals: Globals, cls: ClassDecl) -> InstanceIndex:
+    return globals.cached(cls, ("instances",), InstanceIndex)
+
+
+def add_instance(globals: Globals, cls: ClassDecl, inst_id: int, c: Class):
+    globals.generation += 1
+    instances(globals, cls).add(inst_id, c)
+
+
+def _head(v: IR) -> object:
+    if isinstance(v, Data) or isinstance(v, Ctor) or isinstance(v, Class):
+        return v.name.id
+    if isinstance(v, Type):
+        return Type
+    return None
+
+
 @dataclass
 class Inliner:
-    holes: OrderedDict[int, Hole]
-    globals: dict[int, Decl]
+    holes: Holes
+    globals: Globals
     can_recurse: bool = True
     env: dict[int, IR] = field(default_factory=dict)
+    unfold: bool = True
 
     def run(self, v: IR) -> IR:
+        if v.fp is not None:
+            return v
         if isinstance(v, Ref):
-            return self.run(_rn(self.env[v.name.id])) if v.name.id in self.env else v
+            if (x := self.env.get(v.name.id)) is None:
+                return v
+            env, self.env = self.env, {}
+            try:
+                return self.run(_rn(x))
+            finally:
+                self.env = env
         if isinstance(v, Call):
             f = self.run(v.callee)
             x = self.run(v.arg)
             if isinstance(f, Fn):
                 return self.run_with(f.body, (f.param.name, x))
-            return Call(f, x)
+            return v if f is v.callee and x is v.arg else Call(f, x)
         if isinstance(v, Fn):
-            return Fn(self._param(v.param), self.run(v.body))
+            p = self._param(v.param)
+            return Fn(p, self._under(v.param, p, v.body))
         if isinstance(v, FnType):
-            return FnType(self._param(v.param), self.run(v.ret))
+            p = self._param(v.param)
+            return FnType(p, self._under(v.param, p, v.ret))
         if isinstance(v, Placeholder):
-            h = self.holes[v.id]
-            h.answer.type = self.run(h.answer.type)
-            return v if h.answer.is_unsolved() else self.run(h.answer.value)
+            if not self.can_recurse:
+                h = self.holes[v.id]
+                h.answer.type = self.run(h.answer.type)
+                return v if h.answer.is_unsolved() else self.run(h.answer.value)
+            a = self.zonk(v)
+            if a.nf is None:
+                return v
+            return self.run(a.nf) if not a.refs.isdisjoint(self.env) else a.nf
         if isinstance(v, Ctor):
-            return Ctor(v.ty_name, v.name, [self.run(v) for v in v.args])
+            xs = [self.run(x) for x in v.args]
+            return v if _same(xs, v.args) else Ctor(v.ty_name, v.name, xs)
         if isinstance(v, Data):
-            return Data(v.name, [self.run(v) for v in v.args])
+            xs = [self.run(x) for x in v.args]
+            return v if _same(xs, v.args) else Data(v.name, xs)
         if isinstance(v, Match):
             arg = self.run(v.arg)
+            if not self.unfold:
+                arg = self._unfold_head(arg)
             can_recurse = self.can_recurse
             self.can_recurse = False
-            cases = {
-                i: Case(c.ctor, [self._param(p) for p in c.params], self.run(c.body))
-                for i, c in v.cases.items()
-            }
+            cases = {i: self._case(c) for i, c in v.cases.items()}
             self.can_recurse = can_recurse
             if not isinstance(arg, Ctor):
                 return Match(arg, cases)
@@ -310,36 +667,106 @@ class Inliner:
             if self.can_recurse:
                 d = self.globals[v.name.id]
                 if isinstance(d, Def):
-                    return from_def(d)[0]
+                    return _rn(def_value(self.globals, d))
                 assert isinstance(d, Sig)
             return v
+        if isinstance(v, Global):
+            if not self.unfold:
+                return v
+            return self.run(def_value(self.globals, _c(Def, self.globals[v.name.id])))
         if isinstance(v, Class):
-            return Class(v.name, [self.run(t) for t in v.args])
+            xs = [self.run(x) for x in v.args]
+            return v if _same(xs, v.args) else Class(v.name, xs)
         if isinstance(v, Field):
             c = _c(Class, self.run(v.type))
             if c.is_unsolved():
-                return Field(v.name, c)
-            i = self._resolve_instance(c)
-            val = next(val for n, val in i.fields if _c(Ref, n).name.id == v.name.id)
-            return self.run(val)
+                return v if c is v.type else Field(v.name, c)
+            i = _c(Instance, self._resolve_instance(c))
+            cls = _c(ClassDecl, self.globals[c.name.id])
+            return self.run(instances(self.globals, cls).field(i, v.name))
         assert isinstance(v, Type) or isinstance(v, Nomatch)
         return v
 
     def run_with(self, x: IR, *env: tuple[Name, IR]):
+        old = [(n.id, self.env.get(n.id)) for n, _ in env]
         self.env.update({n.id: v for n, v in env})
-        return self.run(x)
+        try:
+            return self.run(x)
+        finally:
+            self._restore(old)
 
     def apply(self, f: IR, *args: IR):
         ret = f
-        for x in args:
-            if isinstance(ret, Fn):
-                ret = self.run_with(ret.body, (ret.param.name, x))
-            else:
-                ret = Call(ret, x)
+        with self._folded():
+            for x in args:
+                if isinstance(ret, Fn):
+                    ret = self.run_with(ret.body, (ret.param.name, x))
+                else:
+                    ret = Call(ret, x)
         return ret
 
+    def whnf(self, v: IR) -> IR:
+        with self._folded():
+            return self._unfold_head(self.run(v))
+
+    def delta(self, v: IR) -> IR:
+        f, xs = _spine(v)
+        d = _c(Def, self.globals[_c(Global, f).name.id])
+        return self.apply(self.run(def_value(self.globals, d)), *xs)
+
+    def zonk(self, p: Placeholder) -> Answer:
+        a, epoch, version = self.holes[p.id].answer, *self.holes.stamp()
+        if a.stamp == (epoch, -1) or a.stamp == (epoch, version):
+            return a
+        i = Inliner(self.holes, self.globals)
+        a.type = i.run(a.type)
+        a.nf = None if a.is_unsolved() else i.run(_c(IR, a.value))
+        a.refs = frozenset(_refs(a.nf)) if a.nf is not None else frozenset({None})
+        final = None not in a.refs and None not in _refs(a.type)
+        a.stamp = epoch, -1 if final else version
+        return a
+
+    def _restore(self, old: list[tuple[int, Optional[IR]]]):
+        for i, v in reversed(old):
+            if v is None:
+                self.env.pop(i, None)
+            else:
+                self.env[i] = v
+
+    @contextmanager
+    def _folded(self):
+        unfold, self.unfold = self.unfold, False
+        try:
+            yield
+        finally:
+            self.unfold = unfold
+
+    def _unfold_head(self, v: IR) -> IR:
+        while isinstance(_spine(v)[0], Global):
+            v = self.delta(v)
+        return v
+
+    def _case(self, c: Case):
+        old = [(p.name.id, self.env.get(p.name.id)) for p in c.params]
+        try:
+            ps = []
+            for p in c.params:
+                ps.append(self._param(p))
+                if ps[-1].name is not p.name:
+                    self.env[p.name.id] = Ref(ps[-1].name)
+            return Case(c.ctor, ps, self.run(c.body))
+        finally:
+            self._restore(old)
+
+    def _under(self, old: Param[IR], new: Param[IR], v: IR):
+        if new.name is old.name:
+            return self.run(v)
+        return self.run_with(v, (old.name, Ref(new.name)))
+
     def _param(self, param: Param[IR]):
-        p = Param(param.name, self.run(param.type), param.is_implicit, param.is_class)
+        t = self.run(param.type)
+        x = Name(param.name.text) if self.env else param.name
+        p = Param(x, t, param.is_implicit, param.is_class)
         if not p.is_class:
             return p
         ty = _c(Class, p.type)
@@ -349,25 +776,44 @@ class Inliner:
 
     def _resolve_instance(self, c: Class) -> Optional[Instance[IR]]:
         cls = _c(ClassDecl, self.globals[c.name.id])
-        for inst_id in cls.instances:
-            i = _c(Instance, self.globals[inst_id])
-            with dirty_holes(self.holes):
-                if Converter(self.holes, self.globals).eq(c, i.type):
-                    return i
-        return None
+        c_eq = Converter(self.holes, self.globals)
+        eq = lambda x, y: self.globals.memo.eq(c_eq, x, y)
+        run_with = lambda x, *env: Inliner(self.holes, self.globals).run_with(x, *env)
+        t = self.globals.tabling
+        match = lambda i: instantiate(
+            t, self.holes, i, c, run_with, eq, self._resolve_instance
+        )
+        return instances(self.globals, cls).resolve(self.globals, c, match)
 
 
 @dataclass(frozen=True)
 class Converter:
-    holes: OrderedDict[int, Hole]
-    globals: dict[int, Decl]
+    holes: Holes
+    globals: Globals
 
     def eq(self, lhs: IR, rhs: IR):
+        if lhs.fp is not None and rhs.fp is not None:
+            return lhs is rhs
+        (f, xs), (g, ys) = _spine(lhs), _spine(rhs)
+        if isinstance(f, Global) and isinstance(g, Global):
+            if f.name.id == g.name.id and self._spine(xs, ys):
+                return True
+            hf, hg = self._height(f), self._height(g)
+            lhs = self._delta(lhs) if hf >= hg else lhs
+            return self.eq(lhs, self._delta(rhs) if hg >= hf else rhs)
         match lhs, rhs:
+            case Global() as x, y:
+                return self.eq(self._delta(x), y)
+            case x, Global() as y:
+                return self.eq(x, self._delta(y))
             case Placeholder() as x, y:
                 return self._solve(x, y)
             case x, Placeholder() as y:
                 return self._solve(y, x)
+            case Call() as x, y if isinstance(f, Global):
+                return self.eq(self._delta(x), y)
+            case x, Call() as y if isinstance(g, Global):
+                return self.eq(x, self._delta(y))
             case Ref(x), Ref(y):
                 return x.id == y.id
             case Call(f, x), Call(g, y):
@@ -400,7 +846,7 @@ class Converter:
         h = self.holes[p.id]
         if not h.answer.is_unsolved():
             return self.eq(h.answer.value, answer)
-        h.answer.value = answer
+        self.holes.solve(p.id, answer)
 
         if isinstance(answer, Ref):
             for param in h.locals.values():
@@ -412,3 +858,197 @@ class Converter:
     def _args(self, xs: list[IR], ys: list[IR]):
         assert len(xs) == len(ys)
         return all(self.eq(x, y) for x, y in zip(xs, ys))
+
+    def _spine(self, xs: list[IR], ys: list[IR]):
+        if len(xs) != len(ys):
+            return False
+        return self.holes.attempt(lambda: self._args(xs, ys))
+
+    def _height(self, g: Global):
+        return def_height(self.globals, _c(Def, self.globals[g.name.id]))
+
+    def _delta(self, v: IR) -> IR:
+        return Inliner(self.holes, self.globals, unfold=False).delta(v)
+
+
+def _spine(v: IR) -> tuple[IR, list[IR]]:
+    xs = []
+    while isinstance(v, Call):
+        xs.append(v.arg)
+        v = v.callee
+    return v, xs[::-1]
+
+
+@dataclass
+class ConvCache:
+    size: int = 4096
+    entries: OrderedDict[tuple, bool] = field(default_factory=OrderedDict, repr=False)
+    hits: int = 0
+    misses: int = 0
+
+    def eq(self, c: Converter, lhs: IR, rhs: IR) -> bool:
+        if (x := _key(lhs, {})) is None or (y := _key(rhs, {})) is None:
+            return c.eq(lhs, rhs)
+        k = x, y
+        if (ret := self.entries.get(k)) is not None:
+            self.hits += 1
+            self.entries.move_to_end(k)
+            return ret
+        self.misses += 1
+        ret = self.entries[k] = c.eq(lhs, rhs)
+        if len(self.entries) > self.size:
+            self.entries.popitem(False)
+        return ret
+
+
+def _key(v: IR, scope: dict[int, int]) -> Optional[tuple]:
+    if v.fp is not None:
+        return ("#", v.fp)
+    if isinstance(v, Ref):
+        i = scope.get(v.name.id)
+        return ("r", v.name.id) if i is None else ("v", i)
+    if isinstance(v, Call):
+        f, x = _key(v.callee, scope), _key(v.arg, scope)
+        return None if f is None or x is None else ("@", f, x)
+    if isinstance(v, Fn) or isinstance(v, FnType):
+        p = v.param
+        t = _key(p.type, scope)
+        b = _key(
+            v.body if isinstance(v, Fn) else v.ret, scope | {p.name.id: len(scope)}
+        )
+        return None if t is None or b is None else (type(v), p.is_implicit, t, b)
+    if isinstance(v, Data) or isinstance(v, Class) or isinstance(v, Ctor):
+        xs = [_key(x, scope) for x in v.args]
+        if any(x is None for x in xs):
+            return None
+        if isinstance(v, Ctor):
+            return Ctor, v.ty_name.id, v.name.id, *xs
+        return type(v), v.name.id, *xs
+    if isinstance(v, Field):
+        t = _key(v.type, scope)
+        return None if t is None else (Field, v.name.id, t)
+    if isinstance(v, Global) or isinstance(v, Recur):
+        return type(v), v.name.id
+    if isinstance(v, Type) or isinstance(v, Nomatch):
+        return (type(v),)
+    return None
+
+
+def unfold(i: Inliner, v: IR) -> IR:
+    if v.fp is not None:
+        return v
+    if isinstance(v, Global):
+        return def_value(i.globals, _c(Def, i.globals[v.name.id]))
+    if isinstance(v, Call):
+        return i.apply(unfold(i, v.callee), unfold(i, v.arg))
+    if isinstance(v, Fn):
+        return Fn(_unfold_param(i, v.param), unfold(i, v.body))
+    if isinstance(v, FnType):
+        return FnType(_unfold_param(i, v.param), unfold(i, v.ret))
+    if isinstance(v, Data) or isinstance(v, Class):
+        xs = [unfold(i, x) for x in v.args]
+        return v if _same(xs, v.args) else type(v)(v.name, xs)
+    if isinstance(v, Ctor):
+        xs = [unfold(i, x) for x in v.args]
+        return v if _same(xs, v.args) else Ctor(v.ty_name, v.name, xs)
+    if isinstance(v, Match):
+        cases = {
+            n: Case(c.ctor, [_unfold_param(i, p) for p in c.params], unfold(i, c.body))
+            for n, c in v.cases.items()
+        }
+        return Match(unfold(i, v.arg), cases)
+    if isinstance(v, Field):
+        t = unfold(i, v.type)
+        return v if t is v.type else Field(v.name, t)
+    return v
+
+
+def zonk(i: Inliner, v: IR) -> IR:
+    if v.fp is not None:
+        return v
+    if isinstance(v, Placeholder):
+        nf = i.zonk(v).nf
+        return v if nf is None else nf
+    if isinstance(v, Call):
+        f, x = zonk(i, v.callee), zonk(i, v.arg)
+        return v if f is v.callee and x is v.arg else Call(f, x)
+    if isinstance(v, Fn):
+        p, b = _zonk_param(i, v.param), zonk(i, v.body)
+        return v if p is v.param and b is v.body else Fn(p, b)
+    if isinstance(v, FnType):
+        p, b = _zonk_param(i, v.param), zonk(i, v.ret)
+        return v if p is v.param and b is v.ret else FnType(p, b)
+    if isinstance(v, Data) or isinstance(v, Class):
+        xs = [zonk(i, x) for x in v.args]
+        return v if _same(xs, v.args) else type(v)(v.name, xs)
+    if isinstance(v, Ctor):
+        xs = [zonk(i, x) for x in v.args]
+        return v if _same(xs, v.args) else Ctor(v.ty_name, v.name, xs)
+    if isinstance(v, Match):
+        cases = {
+            n: Case(c.ctor, [_zonk_param(i, p) for p in c.params], zonk(i, c.body))
+            for n, c in v.cases.items()
+        }
+        return Match(zonk(i, v.arg), cases)
+    if isinstance(v, Field):
+        t = zonk(i, v.type)
+        return v if t is v.type else Field(v.name, t)
+    return v
+
+
+def _zonk_param(i: Inliner, p: Param[IR]):
+    t = zonk(i, p.type)
+    return p if t is p.type else Param(p.name, t, p.is_implicit, p.is_class)
+
+
+def _refs(v: IR):
+    if v.fp is not None:
+        return
+    if isinstance(v, Ref):
+        yield v.name.id
+    elif isinstance(v, Placeholder):
+        yield None
+    elif isinstance(v, Call):
+        yield from _refs(v.callee)
+        yield from _refs(v.arg)
+    elif isinstance(v, Fn) or isinstance(v, FnType):
+        yield from _refs(v.param.type)
+        yield from _refs(v.body if isinstance(v, Fn) else v.ret)
+    elif isinstance(v, Data) or isinstance(v, Class) or isinstance(v, Ctor):
+        for x in v.args:
+            yield from _refs(x)
+    elif isinstance(v, Match):
+        yield from _refs(v.arg)
+        for c in v.cases.values():
+            for p in c.params:
+                yield from _refs(p.type)
+            yield from _refs(c.body)
+    elif isinstance(v, Field):
+        yield from _refs(v.type)
+
+
+def _globals(v: IR):
+    if isinstance(v, Global):
+        yield v.name.id
+    elif isinstance(v, Call):
+        yield from _globals(v.callee)
+        yield from _globals(v.arg)
+    elif isinstance(v, Fn) or isinstance(v, FnType):
+        yield from _globals(v.param.type)
+        yield from _globals(v.body if isinstance(v, Fn) else v.ret)
+    elif isinstance(v, Data) or isinstance(v, Class) or isinstance(v, Ctor):
+        for x in v.args:
+            yield from _globals(x)
+    elif isinstance(v, Match):
+        yield from _globals(v.arg)
+        for c in v.cases.values():
+            for p in c.params:
+                yield from _globals(p.type)
+            yield from _globals(c.body)
+    elif isinstance(v, Field):
+        yield from _globals(v.type)
+
+
+def _unfold_param(i: Inliner, p: Param[IR]):
+    t = unfold(i, p.type)
+    return p if t is p.type else Param(p.name, t, p.is_implicit, p.is_class)
@@ -0,0 +1,201 @@
+import re
+from array import array
+from bisect import bisect_left, bisect_right
+from dataclasses import dataclass
+
+(
+    IDENT,
+    DEF,
+    EXAMPLE,
+    IND,
+    WHERE,
+    OPEN,
+    TYPE,
+    NOMATCH,
+    MATCH,
+    WITH,
+    UNDER,
+    CLASS,
+    INST,
+    FUN,
+    LPAREN,
+    RPAREN,
+    LBRACE,
+    RBRACE,
+    LBRACKET,
+    RBRACKET,
+    COLON,
+    BAR,
+    ASSIGN,
+    ARROW,
+    TO,
+    LAMBDA,
+    ADD,
+    SUB,
+    MUL,
+    DIV,
+    JUNK,
+    END,
+) = range(32)
+
+_WORDS = "def example inductive where open Type nomatch match with _ class instance fun"
+KEYWORDS = {w: k for k, w in enumerate(_WORDS.split(), DEF)}
+
+SYMBOLS = {
+    "(": LPAREN,
+    ")": RPAREN,
+    "{": LBRACE,
+    "}": RBRACE,
+    "[": LBRACKET,
+    "]": RBRACKET,
+    ":": COLON,
+    "|": BAR,
+    ":=": ASSIGN,
+    "≔": ASSIGN,
+    "->": ARROW,
+    "→": ARROW,
+    "=>": TO,
+    "↦": TO,
+    "λ": LAMBDA,
+    "+": ADD,
+    "-": SUB,
+    "*": MUL,
+    "/": DIV,
+}
+
+COMMENT = r"/-(?:[^-]|-(?!/))*-/"
+IDENT_START = "A-Z_a-zªµºÀ-ÖØ-öø-ÿ"
+IDENT_BODY = "0-9A-Z_a-zªµ·ºÀ-ÖØ-öø-ÿ"
+
+_symbols = "|".join(map(re.escape, sorted(SYMBOLS, key=len, reverse=True)))
+_token = lambda start, body: re.compile(
+    rf"([ \t\r\n]+)|({COMMENT})|([{start}][{body}]*)|({_symbols})|(.)", re.S
+)
+_ASCII = _token("A-Z_a-z", "0-9A-Z_a-z")
+_LATIN = _token(IDENT_START, IDENT_BODY)
+
+
+@dataclass(frozen=True)
+class Tokens:
+    text: str
+    kinds: array
+    starts: array
+    ends: array
+    inline: bytearray
+
+    def __len__(self):
+        return len(self.kinds)
+
+    def __getitem__(self, i: int):
+        return self.text[self.starts[i] : self.ends[i]]
+
+
+def tokenize(s: str):
+    kinds, starts, ends, inline = array("i"), array("i"), array("i"), bytearray()
+    kind, start, end, push = kinds.append, starts.append, ends.append, inline.append
+    keywords, symbols = KEYWORDS.get, SYMBOLS.__getitem__
+    is_inline = 1
+    for m in (_ASCII if s.isascii() else _LATIN).finditer(s):
+        match m.lastindex:
+            case 1:
+                is_inline = "\n" not in m.group()
+                continue
+            case 2:
+                is_inline = 1
+                continue
+            case 3:
+                kind(keywords(m.group(), IDENT))
+            case 4:
+                kind(symbols(m.group()))
+            case _:
+                kind(JUNK)
+        start(m.start())
+        end(m.end())
+        push(is_inline)
+        is_inline = 1
+    kind(END)
+    start(len(s))
+    end(len(s))
+    push(is_inline)
+    return Tokens(s, kinds, starts, ends, inline)
+
+
+_DECL = re.compile(
+    rf"{COMMENT}|^(def|example|inductive|class|instance)(?![{IDENT_BODY}])"
+    rf"((?:[ \t\r\n]+|{COMMENT})*(?::=|≔))?",
+    re.M,
+)
+
+
+def chunks(s: str):
+    starts, inst = [0], False
+    for m in _DECL.finditer(s):
+        if m.group(1) is None or (inst and m.group(2)):
+            continue
+        inst = m.group(1) == "instance"
+        starts.append(m.start())
+    starts.append(len(s))
+    return [(i, s[i:j]) for i, j in zip(starts, starts[1:]) if i < j]
+
+
+_DECLS = {DEF, EXAMPLE, IND, CLASS, INST}
+
+
+def resync(t: Tokens, done: int, loc: int):
+    failed = t.starts[bisect_left(t.starts, done)]
+    for i in range(bisect_left(t.starts, loc), len(t) - 1):
+        if t.kinds[i] in _DECLS and t.starts[i] > failed:
+            return t.starts[i]
+    return None
+
+
+def fences(buf):
+    nl, opening, closing = (
+        ("\n", "```lean", "\n```")
+        if isinstance(buf, str)
+        else (b"\n", b"```lean", b"\n```")
+    )
+    ret = []
+    pos = done = chars = 0
+    while (i := buf.find(opening, pos)) != -1:
+        pos = i + len(opening)
+        if i and buf[i - 1 : i] != nl:
+            continue
+        start = buf.find(nl, pos) + 1
+        if not start or buf[pos:start].strip():
+            continue
+        end = start - 2
+        while (end := buf.find(closing, end + 1)) != -1:
+            eol = buf.find(nl, end + 1)
+            if not buf[end + len(closing) : len(buf) if eol == -1 else eol].strip():
+                break
+        if end == -1:
+            break
+        end += 1
+        if isinstance(buf, str):
+            ret.append((start, buf[start:end]))
+        else:
+            chars += len(buf[done:start].decode())
+            text = buf[start:end].decode()
+            ret.append((chars, text))
+            chars += len(text)
+            done = end
+        pos = end
+    return ret
+
+
+@dataclass(frozen=True)
+class SourceMap:
+    starts: array
+
+    def lineno(self, loc: int):
+        return bisect_right(self.starts, loc)
+
+    def col(self, loc: int):
+        return loc - self.starts[self.lineno(loc) - 1] + 1
+
+
+def source_map(s: str):
+    starts = array("i", [0])
+    starts.extend(m.end() for m in re.finditer("\n", s))
+    return SourceMap(starts)
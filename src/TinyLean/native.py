@@ -0,0 +1,367 @@
+import re
+from sys import intern
+from dataclasses import dataclass
+from functools import reduce
+
+from . import Name, Param, Def, Example, Data, Ctor, Class, Field, Instance, ast
+from .lexer import *
+
+_GAP = re.compile(rf"(?:[ \t\r\n]*{COMMENT})*[ \t\r]*(?:[ \t\r\n]*{COMMENT})*")
+
+_CLOSE = {LBRACE: RBRACE, LPAREN: RPAREN, LBRACKET: RBRACKET}
+_OPS = ({MUL: "*", DIV: "/"}, {ADD: "+", SUB: "-"})
+_NAMES = {k: w for w, k in (KEYWORDS | SYMBOLS).items()}
+
+
+class _Error(Exception):
+    def __init__(self, loc: int, msg: str):
+        super().__init__(loc, msg)
+        self.loc = loc
+        self.msg = msg
+
+
+class _Miss(_Error): ...
+
+
+class _Fatal(_Error): ...
+
+
+class _Abort(_Error): ...
+
+
+@dataclass
+class Reader:
+    tokens: Tokens
+    i: int = 0
+
+    def program(self):
+        decls = {
+            DEF: self._def,
+            EXAMPLE: self._example,
+            IND: self._data,
+            CLASS: self._class,
+            INST: self._inst,
+        }
+        while (k := self._kind()) != END:
+            if k not in decls:
+                raise _Abort(self._loc(), "Expected end of text")
+            yield self._commit(decls[k], self._loc())
+
+    def expr(self):
+        return self._infix(len(_OPS) - 1)
+
+    def _commit(self, f, *args):
+        try:
+            return f(*args)
+        except _Miss as e:
+            raise _Fatal(e.loc, e.msg) from None
+
+    def _def(self, _):
+        self.i += 1
+        r = self._ref()
+        params = self._params()
+        ret = self._return_type()
+        self._expect(ASSIGN)
+        body = self.expr()
+        return Def(r.loc, r.name, params, ret, body, end=self._end())
+
+    def _example(self, loc: int):
+        self.i += 1
+        params = self._params()
+        ret = self._return_type()
+        self._expect(ASSIGN)
+        body = self.expr()
+        return Example(loc, params, ret, body, end=self._end())
+
+    def _data(self, loc: int):
+        self.i += 1
+        r = self._ref()
+        params = self._params()
+        self._keyword(WHERE)
+        ctors = []
+        while self._kind() == BAR:
+            self.i += 1
+            c = self._ref()
+            ps = self._params()
+            args = self._many(self._type_arg)
+            ctors.append(Ctor(c.loc, c.name, ps, args, end=self._end()))
+        self._open(loc, r.name, "datatype")
+        return Data(r.loc, r.name, params, ctors, end=self._end())
+
+    def _class(self, loc: int):
+        self.i += 1
+        r = self._ref()
+        params = self._params()
+        self._keyword(WHERE)
+        fields = self._many(self._field)
+        self._open(loc, r.name, "class")
+        return Class(r.loc, r.name, params, fields, end=self._end())
+
+    def _inst(self, loc: int):
+        self.i += 1
+        params = self._params()
+        self._expect(COLON)
+        t = self.expr()
+        self._keyword(WHERE)
+        fields = self._many(self._inst_field)
+        return Instance(loc, t, fields, params=params, end=self._end())
+
+    def _open(self, loc: int, name: Name, what: str):
+        self._keyword(OPEN)
+        if self._name().text != name.text:
+            raise _Abort(loc, f"open and {what} name mismatch")
+
+    def _type_arg(self):
+        self._expect(LPAREN)
+        n = self._ref()
+        self._expect(ASSIGN)
+        v = self.expr()
+        self._expect(RPAREN)
+        return n, v
+
+    def _field(self):
+        loc = self._loc()
+        n = self._name()
+        self._expect(COLON)
+        t = self.expr()
+        return Field(loc, n, t, end=self._end())
+
+    def _inst_field(self):
+        n = self._ref()
+        self._expect(ASSIGN)
+        return n, self.expr()
+
+    def _params(self):
+        return self._many(self._param)
+
+    def _param(self):
+        opening = self._kind()
+        if opening not in _CLOSE:
+            raise _Miss(self._loc(), "Expected param")
+        self.i += 1
+        n = self._name()
+        self._expect(COLON)
+        t = self.expr()
+        self._expect(_CLOSE[opening])
+        return Param(n, t, opening != LPAREN, opening == LBRACKET)
+
+    def _return_type(self):
+        save = self.i
+        if self._kind() == COLON:
+            self.i += 1
+            try:
+                return self.expr()
+            except _Miss:
+                self.i = save
+        loc = self._loc()
+        return ast.Placeholder(loc, False, end=loc)
+
+    def _infix(self, level: int):
+        loc = self._loc()
+        lhs = self._operand(level)
+        ops = _OPS[level]
+        while op := ops.get(self._kind()):
+            save = self.i
+            self.i += 1
+            try:
+                rhs = self._operand(level)
+            except _Miss:
+                self.i = save
+                return lhs
+            lhs = ast.binary(loc, op, lhs, rhs, self._end())
+        return lhs
+
+    def _operand(self, level: int):
+        return self._infix(level - 1) if level else self._atom()
+
+    def _atom(self):
+        k = self._kind()
+        loc = self._loc()
+        if k == LBRACE or k == LBRACKET:
+            return self._fn_type(loc)
+        if k == LPAREN:
+            save = self.i
+            try:
+                return self._fn_type(loc)
+            except _Miss as e:
+                miss = e
+            self.i = save
+            try:
+                callee = self._paren()
+            except _Miss as e:
+                raise e if e.loc > miss.loc else miss
+            return self._call(loc, callee)
+        if k == LAMBDA or k == FUN:
+            return self._commit(self._fn, loc)
+        if k == MATCH:
+            return self._commit(self._match, loc)
+        if k == NOMATCH:
+            return self._commit(self._nomatch, loc)
+        if k > FUN:
+            raise _Miss(loc, "Expected expression")
+        callee = self._ref()
+        ret = self._call(loc, callee)
+        if ret is callee:
+            if k == TYPE:
+                return ast.Type(loc, end=callee.end)
+            if k == UNDER:
+                return ast.Placeholder(loc, True, end=callee.end)
+        return ret
+
+    def _fn_type(self, loc: int):
+        p = self._param()
+        self._expect(ARROW)
+        ret = self.expr()
+        return ast.FnType(loc, p, ret, end=self._end())
+
+    def _fn(self, loc: int):
+        self.i += 1
+        names = [self._name(), *self._many(self._name)]
+        self._expect(TO)
+        body = self.expr()
+        end = self._end()
+        return reduce(lambda a, n: ast.Fn(loc, n, a, end=end), reversed(names), body)
+
+    def _match(self, loc: int):
+        self.i += 1
+        k = self._kind()
+        if k == TYPE:
+            t = self._ref()
+            arg = ast.Type(t.loc, end=t.end)
+        elif k <= FUN:
+            arg = self._ref()
+        elif k == LPAREN:
+            arg = self._paren()
+        else:
+            raise _Miss(self._loc(), "Expected expression")
+        self._keyword(WITH)
+        cases = [self._case()]
+        while self._kind() == BAR:
+            cases.append(self._case())
+        return ast.Match(loc, arg, cases, end=self._end())
+
+    def _case(self):
+        self._expect(BAR)
+        c = self._ref()
+        names = self._many(self._name)
+        self._expect(TO)
+        body = self.expr()
+        return ast.Case(c.loc, c, names, body, end=self._end())
+
+    def _nomatch(self, loc: int):
+        self.i += 1
+        if self.tokens.inline[self.i] and self._kind() == LPAREN:
+            return ast.Nomatch(loc, self._paren(), end=self._end())
+        arg = self._arg(False)
+        if arg is None:
+            t = self.tokens
+            raise _Miss(
+                _GAP.match(t.text, t.ends[self.i - 1]).end(), "Expected argument"
+            )
+        return ast.Nomatch(loc, arg[0], end=self._end())
+
+    def _call(self, loc: int, callee):
+        while arg := self._arg(True):
+            callee = ast.Call(loc, callee, *arg, end=self._end())
+        return callee
+
+    def _arg(self, can_implicit: bool):
+        if not self.tokens.inline[self.i]:
+            return None
+        k = self._kind()
+        loc = self._loc()
+        if k == LPAREN:
+            save = self.i
+            if can_implicit:
+                try:
+                    return self._implicit_arg()
+                except _Miss:
+                    self.i = save
+            try:
+                return self._paren(), False
+            except _Miss:
+                self.i = save
+                return None
+        if k > FUN:
+            return None
+        if k == TYPE:
+            self.i += 1
+            return ast.Type(loc, end=self._end()), False
+        if k == UNDER:
+            self.i += 1
+            return ast.Placeholder(loc, True, end=self._end()), False
+        return self._ref(), False
+
+    def _implicit_arg(self):
+        self.i += 1
+        n = self._name()
+        self._expect(ASSIGN)
+        v = self.expr()
+        self._expect(RPAREN)
+        return v, n.text
+
+    def _paren(self):
+        self._expect(LPAREN)
+        e = self.expr()
+        self._expect(RPAREN)
+        return e
+
+    def _ref(self):
+        loc = self._loc()
+        return ast.Ref(loc, self._name(), end=self._end())
+
+    def _name(self):
+        if self._kind() > FUN:
+            raise _Miss(self._loc(), "Expected name")
+        self.i += 1
+        return Name(intern(self.tokens[self.i - 1]))
+
+    def _keyword(self, k: int):
+        if self._kind() != k:
+            loc = self._loc()
+            w = _NAMES[k]
+            if self._kind() <= FUN and self.tokens[self.i].startswith(w):
+                loc += len(w)
+            raise _Miss(loc, f"Expected '{w}'")
+        self.i += 1
+
+    def _expect(self, k: int):
+        if self._kind() != k:
+            loc = self._loc()
+            if k == COLON and self._kind() == ASSIGN and self.tokens[self.i] == ":=":
+                loc += 1
+            raise _Miss(loc, f"Expected '{_NAMES[k]}'")
+        self.i += 1
+
+    def _many(self, f):
+        ret = []
+        while True:
+            save = self.i
+            try:
+                ret.append(f())
+            except _Miss:
+                self.i = save
+                return ret
+
+    def _kind(self):
+        return self.tokens.kinds[self.i]
+
+    def _loc(self):
+        return self.tokens.starts[self.i]
+
+    def _end(self):
+        return self.tokens.ends[self.i - 1]
+
+
+def parse(s: str):
+    return list(stream(s))
+
+
+def stream(s: str):
+    try:
+        yield from Reader(tokenize(s)).program()
+    except _Error as e:
+        from pyparsing import ParseException, ParseSyntaxException
+
+        t = ParseSyntaxException if isinstance(e, _Fatal) else ParseException
+        raise t(s, e.loc, e.msg) from None
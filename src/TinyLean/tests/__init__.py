@@ -1,9 +1,20 @@
+import re
+from pathlib import Path
+
 from pyparsing import ParserElement
 
-from .. import ast, grammar
+from .. import ast, grammar, Name
+
+README = Path(__file__).parent / ".." / ".." / ".." / ".github" / "README.md"
+
+with open(README, encoding="utf-8") as f:
+    PROGRAM = "\n".join(re.findall(r"```lean\n(.*?)```", f.read(), re.S))
+
+shape = lambda ds: re.sub(r"id=\d+", "", repr(ds)) + repr(spans(ds))
 
 
 def parse(g: ParserElement, text: str):
+    ast.load_grammar()
     return g.parse_string(text, parse_all=True)
 
 
@@ -17,3 +28,27 @@ def resolve_md(s: str):
 
 def resolve_expr(s: str):
     return ast.NameResolver().expr(parse(grammar.expr, s)[0])
+
+
+def spans(ds):
+    ret = []
+
+    def f(n):
+        if hasattr(n, "end"):
+            ret.append((n.loc, n.end))
+        return n
+
+    ast.remap(ds, f)
+    return ret
+
+
+def remap_names(ds):
+    names = []
+
+    def f(n):
+        if isinstance(n, Name):
+            names.append(n)
+        return n
+
+    ast.remap(ds, f)
+    return names
@@ -0,0 +1,466 @@
+import re
+import subprocess
+import sys
+import threading
+import tracemalloc
+from functools import reduce
+from timeit import timeit
+from typing import cast as _c
+
+from .. import ast, ir, lexer, Name
+
+BENCHES = {}
+
+
+def bench(f):
+    BENCHES[f.__name__] = f
+    return f
+
+
+def program(n: int):
+    return "\n".join(
+        f"""
+inductive N{i} where
+| Z{i}
+| S{i} (n: N{i})
+open N{i}
+
+def add{i} (n: N{i}) (m: N{i}): N{i} :=
+  match n with
+  | Z{i} => m
+  | S{i} pred => S{i} (add{i} pred m)
+
+def id{i} {{T: Type}} (a: T): T := fun x => a /- comment -/
+
+example: N{i} := id{i} (T := N{i}) (add{i} (S{i} Z{i}) Z{i})
+"""
+        for i in range(n)
+    )
+
+
+def church(n: int):
+    return "\n".join(
+        f"""
+def Nat{i}: Type := (T: Type) -> (S: (n: T) -> T) -> (Z: T) -> T
+def add{i} (a: Nat{i}) (b: Nat{i}): Nat{i} := fun T S Z => (a T S) (b T S Z)
+def mul{i} (a: Nat{i}) (b: Nat{i}): Nat{i} := fun T S Z => (a T) (b T S) Z
+def three{i}: Nat{i} := fun T S Z => S (S (S Z))
+def nine{i}: Nat{i} := mul{i} three{i} three{i}
+def n81{i}: Nat{i} := mul{i} nine{i} (add{i} nine{i} nine{i})
+"""
+        for i in range(n)
+    )
+
+
+def peano(n: int, m=50):
+    lit = "".join("S (" for _ in range(m)) + "Z" + ")" * m
+    ps = "\n".join(f"def p{i} (x: P ({lit})): P ({lit}) := x" for i in range(n))
+    return f"""
+inductive N where
+| Z
+| S (n: N)
+open N
+class P (n: N) where
+  p: N
+open P
+{ps}
+"""
+
+
+class Uncons(ir.HashCons):
+    def _cons(self, v: ir.IR, data: tuple, children: tuple[ir.IR, ...]):
+        return v
+
+
+def squares(k: int):
+    big = reduce(lambda a, _: f"sq ({a})", range(k), "three")
+    return f"""
+def Nat: Type := (T: Type) -> (S: (n: T) -> T) -> (Z: T) -> T
+def mul (a: Nat) (b: Nat): Nat := fun T S Z => (a T) (b T S) Z
+def sq (a: Nat): Nat := mul a a
+def three: Nat := fun T S Z => S (S (S Z))
+def big: Nat := {big}
+"""
+
+
+def references(n: int, size=200):
+    big = "".join("S (" for _ in range(size)) + "n" + ")" * size
+    rs = "\n".join(f"def r{i}: (n: N) -> N := big" for i in range(n))
+    return f"""
+inductive N where
+| Z
+| S (n: N)
+open N
+def big (n: N): N := {big}
+{rs}
+"""
+
+
+def layers(n: int, k: int):
+    fs = "\n".join(f"def f{i + 1} (n: N): N := f{i} (f{i} n)" for i in range(k))
+    ex = "\n".join(f"example (x: N) (y: P (f{k} x)): P (f{k} x) := y" for _ in range(n))
+    return f"""
+inductive N where
+| Z
+| S (n: N)
+open N
+def add (n: N) (m: N): N :=
+  match n with
+  | Z => m
+  | S k => S (add k m)
+def f0 (n: N): N := add (S Z) n
+{fs}
+class P (n: N) where
+  p: N
+open P
+{ex}
+"""
+
+
+def instances(n: int, m: int):
+    ds = "\n".join(
+        f"""inductive D{i} where
+| C{i}
+open D{i}
+instance: Show (T := D{i})
+where
+  show := fun x => C{i}"""
+        for i in range(n)
+    )
+    uses = "\n".join(
+        f"example: D{i % n} := show (T := D{i % n}) C{i % n}" for i in range(m)
+    )
+    return f"""
+class Show {{T: Type}} where
+  show: (x: T) -> T
+open Show
+{ds}
+{uses}
+"""
+
+
+def telescope(n: int, k: int, m=20):
+    ts = " ".join(f"{{A{i}: Type}}" for i in range(k))
+    ps = " ".join(f"(a{i}: A{i})" for i in range(k))
+    xs = " ".join(f"(x{i}: N)" for i in range(n))
+    args = " ".join(["Z"] * k)
+    calls = "\n".join(f"example {xs}: N := f {args}" for _ in range(m))
+    return f"""
+inductive N where
+| Z
+open N
+def f {ts} {ps}: A0 := a0
+{calls}
+"""
+
+
+def binders(n: int, m=4):
+    xs = " ".join(f"(x{i}: A)" for i in range(n))
+    return "\n".join(f"def f{j} {{A: Type}} {xs}: A := x0" for j in range(m))
+
+
+def nested(d: int):
+    big = reduce(lambda a, _: f"f ({a})", range(d), "x")
+    return f"""
+inductive N where
+| Z
+open N
+def big (f: {{T: Type}} -> (a: T) -> T) (x: N): N := {big}
+"""
+
+
+def chains(d: int):
+    ts = "\n".join(f"def T{i + 1}: Type := P T{i} T{i}" for i in range(d))
+    fs = "\n".join(f"def F{i + 1}: Type := P F{i} F{i}" for i in range(d))
+    ls = reduce(lambda a, _: f"L ({a})", range(d), "N")
+    pair = """instance {A: Type} {B: Type} [a: Default A] [b: Default B]: Default (P A B)
+where
+  default := MkP (default A (inst := a)) (default B (inst := b))"""
+    return f"""
+inductive N where
+| Z
+open N
+inductive E where
+| MkE
+open E
+inductive P (A: Type) (B: Type) where
+| MkP (a: A) (b: B)
+open P
+inductive L (A: Type) where
+| Nil
+| Cons (a: A) (l: L A)
+open L
+class Default (T: Type) where
+  default: T
+open Default
+instance: Default N
+where
+  default := Z
+{pair}
+{pair}
+instance {{A: Type}} [a: Default A]: Default (L A)
+where
+  default := Cons (default A (inst := a)) Nil
+def T0: Type := N
+{ts}
+def F0: Type := E
+{fs}
+def p: T{d} := default T{d}
+def l: {ls} := default ({ls})
+"""
+
+
+def deep(f):
+    threading.stack_size(512 << 20)
+    sys.setrecursionlimit(1 << 20)
+    t = threading.Thread(target=f)
+    t.start()
+    t.join()
+
+
+def report(name: str, seconds: float, **rates: int):
+    r = "".join(f" {v / seconds:14,.0f} {k}/s" for k, v in rates.items())
+    print(f"{name:<24} {seconds * 1000:10.2f} ms{r}")
+
+
+@bench
+def parser(n=200):
+    s = program(n)
+    for engine in ("pyparsing", "native"):
+        t = timeit(lambda: s | ast.Parser(engine=engine), number=1)
+        report(f"parser[{engine}]", t, chars=len(s))
+    for jobs in (2, 4):
+        t = timeit(lambda: s | ast.Parser(jobs=jobs), number=1)
+        report(f"parser[pyparsing,jobs={jobs}]", t, chars=len(s))
+
+
+@bench
+def infix(depths=(1, 2, 4, 8, 16)):
+    for d in depths:
+        nested = "a"
+        for i in range(d):
+            nested = f"(b{i} * {nested} + c{i} / d{i} - e{i})"
+        s = f"def f := {nested}"
+        for engine in ("pyparsing", "native"):
+            t = timeit(lambda: s | ast.Parser(engine=engine), number=1)
+            report(f"infix[{engine},depth={d}]", t, chars=len(s))
+
+
+@bench
+def tokenizer(n=20_000):
+    s = program(n)
+    t = timeit(lambda: lexer.tokenize(s), number=1)
+    report("tokenizer", t, chars=len(s), tokens=len(lexer.tokenize(s)))
+
+
+@bench
+def incremental(n=2000):
+    s = program(n)
+    edited = s.replace("add0 pred m", "add0 m pred")
+    p = ast.IncrementalParser(engine="native")
+    report("incremental[cold]", timeit(lambda: s | p, number=1), chars=len(s))
+    report("incremental[edit]", timeit(lambda: edited | p, number=1), chars=len(s))
+
+
+@bench
+def markdown(n=2000):
+    s = "".join(
+        f"## Part {i}\n\nSome prose.\n\n```lean\n{program(1)}```\n" for i in range(n)
+    )
+    t = timeit(lambda: lexer.fences(s), number=1)
+    report("markdown[fences]", t, chars=len(s))
+    t = timeit(lambda: s | ast.Parser(is_markdown=True, engine="native"), number=1)
+    report("markdown[native]", t, chars=len(s))
+
+
+@bench
+def sourcemap(n=2000, lookups=1000):
+    from pyparsing import util
+
+    s = program(n)
+    locs = range(0, len(s), len(s) // lookups)
+    t = timeit(lambda: [(util.lineno(i, s), util.col(i, s)) for i in locs], number=1)
+    report("sourcemap[rescan]", t, lookups=len(locs))
+    m = lexer.source_map(s)
+    t = timeit(lambda: [(m.lineno(i), m.col(i)) for i in locs], number=1)
+    report("sourcemap[bisect]", t, lookups=len(locs))
+    report("sourcemap[build]", timeit(lambda: lexer.source_map(s), number=1))
+
+
+@bench
+def memory(n=100):
+    s = church(n)
+    tracemalloc.start()
+    ds = s | ast.Parser(engine="native") | ast.NameResolver() | ast.TypeChecker()
+    current, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    print(f"{'memory[check]':<24} {current >> 10:10,} KiB {peak >> 10:10,} KiB peak")
+    tracemalloc.start()
+    names = [Name(t.text) for d in ds for t in [d.name] * 1000]
+    current, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    print(f"{'memory[name]':<24} {current / len(names):10.1f} B/name")
+    for name, h in (("off", Uncons()), ("on", ir.HashCons())):
+        decls = peano(n * 3) | ast.Parser(engine="native") | ast.NameResolver()
+        cons, ir.cons = ir.cons, h
+        tracemalloc.start()
+        try:
+            ds = decls | ast.TypeChecker()
+            _, peak = tracemalloc.get_traced_memory()
+        finally:
+            tracemalloc.stop()
+            ir.cons = cons
+        label = f"memory[peano,{name}]"
+        print(f"{label:<24} {peak >> 10:10,} KiB peak {h.hits:10,} shared nodes")
+
+
+@bench
+def nbe(ks=(2, 3)):
+    def run():
+        for k in ks:
+            s = squares(k)
+            decls = s | ast.Parser(engine="native") | ast.NameResolver()
+            for engine in ast.ENGINES:
+                c = ast.TypeChecker(engine=engine)
+                t = timeit(lambda: decls | c, number=1)
+                report(f"nbe[{engine},3^{2**k}]", t)
+
+    deep(run)
+
+
+@bench
+def elaborate(n=3000):
+    def run():
+        decls = references(n) | ast.Parser(engine="native") | ast.NameResolver()
+        t = timeit(lambda: decls | ast.TypeChecker(), number=1)
+        report(f"elaborate[{n}]", t, refs=n)
+
+    deep(run)
+
+
+@bench
+def delta(n=50, ks=(4, 8)):
+    def run():
+        for k in ks:
+            decls = layers(n, k) | ast.Parser(engine="native") | ast.NameResolver()
+            for engine in ast.ENGINES:
+                c = ast.TypeChecker(engine=engine)
+                report(f"delta[{engine},{k}]", timeit(lambda: decls | c, number=1))
+
+    deep(run)
+
+
+@bench
+def conv(n=50, m=500):
+    for name, s in (("instances", instances(n, m)), ("church", church(n))):
+        decls = s | ast.Parser(engine="native") | ast.NameResolver()
+        for engine in ast.ENGINES:
+            c = ast.TypeChecker(engine=engine)
+            t = timeit(lambda: decls | c, number=1)
+            hits, misses = c.globals.memo.hits, c.globals.memo.misses
+            label = f"conv[{engine},{name}]"
+            print(
+                f"{label:<24} {t * 1000:10.2f} ms {hits:10,} hits {misses:10,} misses"
+            )
+
+
+@bench
+def contexts(ns=(10, 100, 400), ks=(4, 16)):
+    for k in ks:
+        for n in ns:
+            decls = telescope(n, k) | ast.Parser(engine="native") | ast.NameResolver()
+            c = ast.TypeChecker()
+            tracemalloc.start()
+            t = timeit(lambda: decls | c, number=1)
+            _, peak = tracemalloc.get_traced_memory()
+            tracemalloc.stop()
+            label = f"contexts[n={n},k={k}]"
+            print(f"{label:<24} {t * 1000:10.2f} ms {peak >> 10:10,} KiB peak")
+
+
+@bench
+def scopes(ns=(400, 1600)):
+    for n in ns:
+        decls = binders(n) | ast.Parser(engine="native") | ast.NameResolver()
+        t = timeit(lambda: decls | ast.TypeChecker(), number=1)
+        report(f"scopes[{n}]", t, binders=n * 4)
+
+
+@bench
+def zonk(ds=(10, 40, 80), runs=100):
+    def run():
+        for d in ds:
+            decls = nested(d) | ast.Parser(engine="native") | ast.NameResolver()
+            c = ast.TypeChecker()
+            report(f"zonk[check,{d}]", timeit(lambda: decls | c, number=1))
+            big = ir.Global(next(x.name for x in decls if x.name.text == "big"))
+            i = ir.Inliner(c.holes, c.globals)
+            t = timeit(lambda: i.run(big), number=runs)
+            report(f"zonk[unfold,{d}]", t, unfolds=runs)
+
+    deep(run)
+
+
+@bench
+def lookup(ns=(10, 100, 1000), runs=1000):
+    for n in ns:
+        decls = instances(n, 0) | ast.Parser(engine="native") | ast.NameResolver()
+        c = ast.TypeChecker()
+        decls | c
+        d = [x for x in decls if isinstance(x, ast.Data)][-1]
+        show = next(x for x in decls if isinstance(x, ast.Class))
+        q = ir.Class(show.name, [ir.Data(d.name, [])])
+        i = ir.Inliner(c.holes, c.globals)
+        t = timeit(lambda: i._resolve_instance(q), number=runs)
+        report(f"lookup[{n}]", t, lookups=runs)
+
+
+@bench
+def resolve(n=50, m=2000):
+    decls = instances(n, m) | ast.Parser(engine="native") | ast.NameResolver()
+    show = next(x for x in decls if isinstance(x, ast.Class))
+    for engine in ast.ENGINES:
+        c = ast.TypeChecker(engine=engine)
+        t = timeit(lambda: decls | c, number=1)
+        hits = ir.instances(c.globals, _c(ast.Class, c.globals[show.name.id])).hits
+        print(f"{f'resolve[{engine}]':<24} {t * 1000:10.2f} ms {hits:10,} hits")
+
+
+@bench
+def chained(ds=(8, 16, 32, 64)):
+    def run():
+        for d in ds:
+            decls = chains(d) | ast.Parser(engine="native") | ast.NameResolver()
+            c = ast.TypeChecker(engine="ir")
+            report(f"chained[{d}]", timeit(lambda: decls | c, number=1))
+            f = next(
+                x for x in decls if isinstance(x, ast.Def) and x.name.text == f"F{d}"
+            )
+            default = next(x for x in decls if isinstance(x, ast.Class))
+            i = ir.Inliner(c.holes, c.globals)
+            q = ir.cons.run(ir.Class(default.name, [i.run(ir.Global(f.name))]))
+            t = timeit(lambda: i._resolve_instance(_c(ir.Class, q)), number=1)
+            report(f"chained[{d},failed]", t)
+
+    deep(run)
+
+
+@bench
+def startup(runs=5, budget_ms=100):
+    cmd = [sys.executable, "-X", "importtime", "-m", "TinyLean"]
+    best, modules = float("inf"), set()
+    for _ in range(runs):
+        r = subprocess.run(cmd, capture_output=True, text=True)
+        us = re.findall(r"^import time:\s+\d+ \|\s+(\d+) \| ( *)(\S+)$", r.stderr, re.M)
+        best = min(best, sum(int(t) for t, indent, _ in us if not indent) / 1e6)
+        modules = {m for _, _, m in us}
+    report("startup", best)
+    if "pyparsing" in modules:
+        sys.exit("startup: pyparsing imported eagerly")
+    if best * 1000 > budget_ms:
+        sys.exit(f"startup: over budget of {budget_ms} ms")
+
+
+if __name__ == "__main__":
+    for name in sys.argv[1:] or BENCHES:
+        BENCHES[name]()
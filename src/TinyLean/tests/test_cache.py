@@ -0,0 +1,54 @@
+import os
+from pathlib import Path
+from tempfile import TemporaryDirectory
+from unittest import TestCase, mock
+
+from . import PROGRAM, remap_names, shape
+from .. import ast
+from ..cache import Cache
+
+
+class TestCache(TestCase):
+    def setUp(self):
+        d = TemporaryDirectory()
+        self.addCleanup(d.cleanup)
+        self.path = Path(d.name)
+
+    def test_hit(self):
+        c = Cache(self.path)
+        a = PROGRAM | c
+        (f,) = self.path.glob("*.pickle")
+        os.utime(f, ns=(0, 0))
+        b = PROGRAM | c
+        self.assertEqual(shape(a), shape(b))
+        self.assertGreater(f.stat().st_mtime_ns, 0)
+        ids_a = {n.id for n in remap_names(a)}
+        ids_b = {n.id for n in remap_names(b)}
+        self.assertFalse(ids_a & ids_b)
+        b | ast.TypeChecker()
+
+    def test_markdown_key(self):
+        s = "def a: Type := Type"
+        self.assertNotEqual(Cache(self.path).key(s), Cache(self.path, True).key(s))
+
+    def test_schema_key(self):
+        s = "def a: Type := Type"
+        key = Cache(self.path).key(s)
+        with mock.patch("TinyLean.cache.SCHEMA", -1):
+            self.assertNotEqual(key, Cache(self.path).key(s))
+
+    def test_corrupted(self):
+        c = Cache(self.path)
+        s = "def a: Type := Type"
+        (self.path / f"{c.key(s)}.pickle").write_bytes(b"garbage")
+        (d,) = s | c
+        self.assertEqual("a", d.name.text)
+        (d,) = s | c
+        self.assertEqual("a", d.name.text)
+
+    def test_evict(self):
+        c = Cache(self.path, max_bytes=1)
+        "def a: Type := Type" | c
+        "def b: Type := Type" | c
+        (f,) = self.path.glob("*.pickle")
+        self.assertEqual(c.key("def b: Type := Type"), f.stem)
@@ -191,15 +191,15 @@ class TestTypeChecker(TestCase):
         assert isinstance(x, Data)
         self.assertEqual(2, len(x.ctors))
 
-        n_v, n_ty = ir.from_data(x)
+        n_v, n_ty = ir.from_data(ir.Globals(), x)
         self.assertEqual("N", str(n_v))
         self.assertEqual("Type", str(n_ty))
 
-        z_v, z_ty = ir.from_ctor(x.ctors[0], x)
+        z_v, z_ty = ir.from_ctor(ir.Globals(), x.ctors[0], x)
         self.assertEqual("N.Z", str(z_v))
         self.assertEqual("N", str(z_ty))
 
-        s_v, s_ty = ir.from_ctor(x.ctors[1], x)
+        s_v, s_ty = ir.from_ctor(ir.Globals(), x.ctors[1], x)
         self.assertEqual("λ (n: N) ↦ (N.S n)", str(s_v))
         self.assertEqual("(n: N) → N", str(s_ty))
 
@@ -238,15 +238,15 @@ class TestTypeChecker(TestCase):
         assert isinstance(x, Data)
         self.assertEqual(2, len(x.ctors))
 
-        maybe_v, maybe_ty = ir.from_data(x)
+        maybe_v, maybe_ty = ir.from_data(ir.Globals(), x)
         self.assertEqual("λ (A: Type) ↦ (Maybe A)", str(maybe_v))
         self.assertEqual("(A: Type) → Type", str(maybe_ty))
 
-        nothing_v, nothing_ty = ir.from_ctor(x.ctors[0], x)
+        nothing_v, nothing_ty = ir.from_ctor(ir.Globals(), x.ctors[0], x)
         self.assertEqual("λ {A: Type} ↦ Maybe.Nothing", str(nothing_v))
         self.assertEqual("{A: Type} → (Maybe A)", str(nothing_ty))
 
-        just_v, just_ty = ir.from_ctor(x.ctors[1], x)
+        just_v, just_ty = ir.from_ctor(ir.Globals(), x.ctors[1], x)
         self.assertEqual("λ {A: Type} ↦ λ (a: A) ↦ (Maybe.Just a)", str(just_v))
         self.assertEqual("{A: Type} → (a: A) → (Maybe A)", str(just_ty))
 
@@ -320,15 +320,15 @@ class TestTypeChecker(TestCase):
         assert isinstance(x, Data)
         self.assertEqual(2, len(x.ctors))
 
-        vec_v, vec_ty = ir.from_data(x)
+        vec_v, vec_ty = ir.from_data(ir.Globals(), x)
         self.assertEqual("λ (A: Type) ↦ λ (n: N) ↦ (Vec A n)", str(vec_v))
         self.assertEqual("(A: Type) → (n: N) → Type", str(vec_ty))
 
-        nil_v, nil_ty = ir.from_ctor(x.ctors[0], x)
+        nil_v, nil_ty = ir.from_ctor(ir.Globals(), x.ctors[0], x)
         self.assertEqual("λ {A: Type} ↦ Vec.Nil", str(nil_v))
         self.assertEqual("{A: Type} → (Vec A N.Z)", str(nil_ty))
 
-        cons_v, cons_ty = ir.from_ctor(x.ctors[1], x)
+        cons_v, cons_ty = ir.from_ctor(ir.Globals(), x.ctors[1], x)
         self.assertEqual(
             "λ {A: Type} ↦ λ {m: N} ↦ λ (a: A) ↦ λ (v: (Vec A m)) ↦ (Vec.Cons m a v)",
             str(cons_v),
@@ -672,6 +672,21 @@ class TestTypeChecker(TestCase):
         self.assertEqual("C", got)
         self.assertEqual(text.index("C where"), loc)
 
+    def test_check_program_class_no_instances(self):
+        text = """
+        inductive N where
+        | Z
+        open N
+        class Show (T: Type) where
+            show: T
+        open Show
+        def x := show N
+        """
+        with self.assertRaises(ir.NoInstanceError) as e:
+            ast.check_string(text)
+        got, _ = e.exception.args
+        self.assertEqual("(Show N)", got)
+
     def test_check_program_instance(self):
         c, i, _, _ = ast.check_string(
             """
@@ -686,6 +701,103 @@ class TestTypeChecker(TestCase):
         assert isinstance(i, Instance)
         self.assertEqual(c.instances[0], i.id)
 
+    def test_check_program_instance_chained(self):
+        *_, i, d = ast.check_string(
+            """
+            inductive N where
+            | Z
+            open N
+
+            inductive P (A: Type) (B: Type) where
+            | MkP (a: A) (b: B)
+            open P
+
+            class Default (T: Type) where
+                default: T
+            open Default
+
+            instance: Default N
+            where
+                default := Z
+
+            instance {A: Type} {B: Type} [a: Default A] [b: Default B]: Default (P A B)
+            where
+                default := MkP (default A (inst := a)) (default B (inst := b))
+
+            def f := default (P N (P N N))
+            """
+        )
+        assert isinstance(i, Instance)
+        self.assertEqual(["A", "B", "a", "b"], [p.name.text for p in i.params])
+        assert isinstance(d, Def)
+        self.assertEqual("(P.MkP N.Z (P.MkP N.Z N.Z))", str(d.body))
+
+    def test_check_program_instance_chained_later(self):
+        *_, d = ast.check_string(
+            """
+            inductive N where
+            | Z
+            open N
+
+            inductive W (A: Type) where
+            | MkW (a: A)
+            open W
+
+            class Show (T: Type) where
+                show: T
+            open Show
+
+            class Default (T: Type) where
+                default: T
+            open Default
+
+            class C (T: Type) where
+                c: T
+            open C
+
+            instance {A: Type} [s: Show A]: Default (W A)
+            where
+                default := MkW (show A (inst := s))
+
+            instance {A: Type} [d: Default A]: C (W A)
+            where
+                c := MkW (default A (inst := d))
+
+            instance: C (W (W N))
+            where
+                c := MkW (MkW Z)
+
+            def x := c (W (W N))
+
+            instance: Show N
+            where
+                show := Z
+
+            def y := default (W N)
+            """
+        )
+        assert isinstance(d, Def)
+        self.assertEqual("(W.MkW N.Z)", str(d.body))
+
+    def test_check_program_instance_cycle_failed(self):
+        text = """
+        inductive N where
+        | Z
+        open N
+        class Default (T: Type) where
+            default: T
+        open Default
+        instance {T: Type} [a: Default T]: Default T
+        where
+            default := default T (inst := a)
+        def f := default N
+        """
+        with self.assertRaises(ir.NoInstanceError) as e:
+            ast.check_string(text)
+        got, loc = e.exception.args
+        self.assertEqual("(Default N)", got)
+        self.assertEqual(text.index("Default (T"), loc)
+
     def test_check_program_instance_miss_failed(self):
         text = """
         class C where
@@ -0,0 +1,82 @@
+from unittest import TestCase, mock
+
+from pyparsing import ParseBaseException
+
+from . import PROGRAM, remap_names, shape
+from .. import ast, lexer
+
+
+class TestIncremental(TestCase):
+    def test_chunks(self):
+        s = "/- def x -/\ndef f := a\n  def\nexample: A := b\n\ninductive A where open A"
+        locs = [loc for loc, _ in lexer.chunks(s)]
+        self.assertEqual([0, 12, 29, 46], locs)
+        self.assertEqual(s, "".join(t for _, t in lexer.chunks(s)))
+
+    def test_chunks_field(self):
+        s = "instance: C\nwhere\nexample := x\n"
+        self.assertEqual([(0, s)], lexer.chunks(s))
+        self.assertEqual(shape(s | ast.Parser()), shape(s | ast.IncrementalParser()))
+
+    def test_chunks_example(self):
+        s = "def a := Type\nexample := a\nexample\n  := a\n"
+        self.assertEqual([0, 14, 27], [loc for loc, _ in lexer.chunks(s)])
+        self.assertEqual(shape(s | ast.Parser()), shape(s | ast.IncrementalParser()))
+
+    def test_same_as_full(self):
+        p = ast.IncrementalParser()
+        self.assertEqual(shape(PROGRAM | ast.Parser()), shape(PROGRAM | p))
+        edited = PROGRAM.replace("def ", "def  ", 1)
+        self.assertEqual(shape(edited | ast.Parser()), shape(edited | p))
+
+    def test_reuse(self):
+        p = ast.IncrementalParser(engine="native")
+        a, b, c = "def f := x\ndef g := y\ndef h := z\n" | p
+        d, e, f = "def f := x\ndef g := yy\ndef h := z\n" | p
+        self.assertIs(a, d)
+        self.assertIsNot(b, e)
+        self.assertEqual(c.loc + 1, f.loc)
+        self.assertEqual(c.body.loc + 1, f.body.loc)
+        self.assertEqual(c.end + 1, f.end)
+        self.assertEqual(c.name.id, f.name.id)
+
+    def test_recheck(self):
+        s = """inductive N where
+| Z
+| S (n: N)
+open N
+class P (n: N) where
+  p: N
+open P
+def h: N := Z
+def g: N := h
+example (x: P Z): P g := x
+"""
+        edited = s.replace("def h: N := Z", "def h: N := S Z")
+        for engine in ast.ENGINES:
+            p = ast.IncrementalParser(engine="native")
+            s | p | ast.NameResolver() | ast.TypeChecker(engine=engine)
+            with self.assertRaises(ast.TypeMismatchError):
+                edited | p | ast.NameResolver() | ast.TypeChecker(engine=engine)
+
+    def test_fallback(self):
+        p = ast.IncrementalParser(engine="native")
+        s = "def f := a +\ndef\ndef g := b"
+        self.assertEqual(shape(s | ast.Parser(engine="native")), shape(s | p))
+        for s, loc in ("def f := x\ndef g :=", 19), ("def f := a +\ndef g := b", 19):
+            with self.assertRaises(ParseBaseException) as e:
+                s | p
+            self.assertEqual(loc, e.exception.loc)
+
+    def test_parallel(self):
+        ds = PROGRAM | ast.Parser(jobs=2, min_chunks=0)
+        self.assertEqual(shape(PROGRAM | ast.Parser()), shape(ds))
+        ids = [n.id for n in remap_names(ds)]
+        self.assertEqual(len(ids), len(set(ids)))
+        ast.relocate(ds, 0) | ast.NameResolver() | ast.TypeChecker()
+        with self.assertRaises(ParseBaseException) as e:
+            "def f := x\ndef g :=" | ast.Parser(jobs=2, min_chunks=0)
+        self.assertEqual(19, e.exception.loc)
+        with mock.patch("concurrent.futures.ProcessPoolExecutor") as pool:
+            self.assertEqual(shape(ds), shape(PROGRAM | ast.Parser(jobs=2)))
+        pool.assert_not_called()
@@ -0,0 +1,290 @@
+from collections import OrderedDict
+from typing import cast as _c
+from unittest import TestCase
+
+from .. import ast, ir, Name, Param, Def, Instance
+
+
+class TestHashCons(TestCase):
+    def test_cons(self):
+        n, z, s = Name("N"), Name("Z"), Name("S")
+        num = lambda k: ir.Ctor(n, s, [num(k - 1)]) if k else ir.Ctor(n, z, [])
+        h = ir.HashCons()
+        a, b = h.run(num(3)), h.run(num(3))
+        self.assertIs(a, b)
+        self.assertIs(a.args[0], h.run(num(2)))
+        self.assertEqual(7, h.hits)
+        self.assertIsInstance(a.args, tuple)
+
+        x = Name("x")
+        fn = h.run(ir.Fn(Param(x, ir.Data(n, []), False), ir.Ref(x)))
+        assert isinstance(fn, ir.Fn)
+        self.assertIsNone(fn.fp)
+        self.assertIsNone(fn.body.fp)
+        self.assertIs(h.run(ir.Data(n, [])), fn.param.type)
+
+    def test_fp(self):
+        n = Name("N")
+        h = ir.HashCons()
+        fp = h.run(ir.Data(n, [])).fp
+        self.assertEqual(0, len(h.nodes))
+        v = h.run(ir.Data(n, []))
+        self.assertNotEqual(fp, v.fp)
+        self.assertEqual(ir.Data(n, []), v)
+        self.assertNotIn("fp", repr(v))
+        self.assertNotEqual(ir._key(v, {}), ("#", fp))
+        self.assertNotEqual(fp, ir.HashCons().run(ir.Data(n, [])).fp)
+
+    def test_eq(self):
+        n, z, s = Name("N"), Name("Z"), Name("S")
+        c = ir.Converter(OrderedDict(), {})
+        one = ir.cons.run(ir.Ctor(n, s, [ir.Ctor(n, z, [])]))
+        zero = ir.cons.run(ir.Ctor(n, z, []))
+        self.assertTrue(c.eq(one, ir.cons.run(ir.Ctor(n, s, [ir.Ctor(n, z, [])]))))
+        self.assertFalse(c.eq(one, zero))
+        self.assertTrue(c.eq(one, ir.Ctor(n, s, [ir.Ctor(n, z, [])])))
+
+
+class TestElaborate(TestCase):
+    def test_from_def(self):
+        n, z, x = Name("N"), Name("Z"), Name("x")
+        t, zero = ir.cons.run(ir.Data(n, [])), ir.cons.run(ir.Ctor(n, z, []))
+        d = Def(0, Name("f"), [Param(x, t, False)], t, ir.Call(ir.Ref(x), zero))
+        g = ir.Globals()
+        (a, _), (b, _) = ir.from_def(g, d), ir.from_def(g, d)
+        self.assertIs(a, b)
+        self.assertIn(("def_value",), g.elaborated[d.name.id][1])
+        self.assertNotIn("_elaborated", vars(d))
+
+        i = ir.Inliner(ir.Holes(), g)
+        f = _c(ir.Fn, i.run(a))
+        self.assertIs(x, f.param.name)
+        g = _c(ir.Fn, i.run_with(a, (Name("y"), ir.Type())))
+        self.assertIsNot(x, g.param.name)
+        self.assertIs(g.param.name, _c(ir.Ref, _c(ir.Call, g.body).callee).name)
+        self.assertIs(zero, _c(ir.Call, g.body).arg)
+        self.assertEqual({}, i.env)
+        body = _c(ir.Fn, a).body
+        self.assertEqual(body, i.run_with(body, (x, ir.Ref(x))))
+
+
+class TestConverter(TestCase):
+    def test_delta(self):
+        text = """
+        inductive N where
+        | Z
+        | S (n: N)
+        open N
+        def f (n: N): N := S n
+        def g (n: N): N := f n
+        """
+        c = ast.TypeChecker()
+        f, g = [d for d in text | ast.Parser() | ast.NameResolver() | c][-2:]
+        x = ir.Ref(Name("x"))
+        call = lambda d, *xs: ir.Call(ir.Global(d.name), *xs)
+        conv = ir.Converter(c.holes, c.globals)
+        self.assertTrue(ir.Converter(c.holes, {}).eq(call(f, x), call(f, x)))
+        self.assertTrue(conv.eq(call(g, x), call(f, x)))
+        self.assertFalse(conv.eq(call(g, x), call(f, ir.Type())))
+        s = _c(ir.Ctor, ir.Inliner(c.holes, c.globals).run(call(f, x)))
+        self.assertTrue(conv.eq(s, call(g, x)))
+        self.assertEqual([1, 2], [ir.def_height(c.globals, d) for d in (f, g)])
+
+    def test_whnf(self):
+        text = """
+        inductive N where
+        | Z
+        | S (n: N)
+        open N
+        def f (n: N): N := S n
+        """
+        c = ast.TypeChecker()
+        f = [d for d in text | ast.Parser() | ast.NameResolver() | c][-1]
+        x = ir.Ref(Name("x"))
+        fx = ir.Call(ir.Global(f.name), x)
+        i = ir.Inliner(c.holes, c.globals)
+        s = _c(ir.Ctor, i.whnf(fx))
+        self.assertIs(x, s.args[0])
+        ssx = _c(ir.Ctor, i.whnf(ir.Ctor(s.ty_name, s.name, [fx])))
+        self.assertIs(fx, ssx.args[0])
+        self.assertIsInstance(_c(ir.Ctor, i.run(ssx)).args[0], ir.Ctor)
+        self.assertTrue(i.unfold)
+
+
+class TestConvCache(TestCase):
+    def test_memo(self):
+        n, x, y = Name("N"), Name("x"), Name("y")
+        t = ir.Data(n, [])
+        fn = lambda a: ir.FnType(Param(a, t, False), ir.Ref(a))
+        memo, c = ir.ConvCache(size=1), ir.Converter(OrderedDict(), {})
+        self.assertTrue(memo.eq(c, fn(x), fn(y)))
+        self.assertTrue(memo.eq(c, fn(y), fn(x)))
+        self.assertEqual((1, 1), (memo.hits, memo.misses))
+        self.assertFalse(memo.eq(c, t, ir.Type()))
+        self.assertEqual(1, len(memo.entries))
+
+        holes = ir.Holes({0: ir.Hole(0, False, ir.Context(), ir.Answer(ir.Type()))})
+        c = ir.Converter(holes, {})
+        self.assertTrue(memo.eq(c, ir.Placeholder(0, False), t))
+        self.assertEqual((1, 2), (memo.hits, memo.misses))
+
+
+class TestHoles(TestCase):
+    def test_trail(self):
+        hole = lambda: ir.Hole(0, False, ir.Context(), ir.Answer(ir.Type()))
+        holes = ir.Holes({0: hole(), 1: hole()})
+        holes.solve(0, ir.Type())
+        self.assertEqual([], holes.trail)
+
+        cp = holes.checkpoint()
+        holes.solve(1, ir.Type())
+        holes[2] = hole()
+        inner = holes.checkpoint()
+        holes.solve(2, ir.Type())
+        holes.commit(inner)
+        self.assertEqual(2, len(holes.trail))
+        holes.rollback(cp)
+        self.assertEqual([0, 1], list(holes))
+        self.assertTrue(holes[1].answer.is_unsolved())
+        self.assertFalse(holes[0].answer.is_unsolved())
+        self.assertEqual((0, []), (holes.depth, holes.trail))
+
+    def test_attempt(self):
+        n = Name("N")
+        holes = ir.Holes({0: ir.Hole(0, False, ir.Context(), ir.Answer(ir.Type()))})
+        c = ir.Converter(holes, {})
+        x = ir.Placeholder(0, False)
+        lhs, rhs = ir.Data(n, [x, ir.Type()]), ir.Data(n, [ir.Type(), x])
+        fail = ir.Data(n, [ir.Type(), ir.Data(n, [])])
+        self.assertFalse(holes.attempt(lambda: c.eq(lhs, fail)))
+        self.assertTrue(holes[0].answer.is_unsolved())
+        self.assertTrue(holes.attempt(lambda: c.eq(lhs, rhs)))
+        self.assertEqual(ir.Type(), holes[0].answer.value)
+
+
+class TestContext(TestCase):
+    def test_push(self):
+        t = ir.Type()
+        a, b, c = (Param(Name(x), t, False) for x in "abc")
+        root = ir.Context().push(a)
+        left, right = root.push(b), root.push(c)
+        self.assertIs(root, left.parent)
+        self.assertIs(root, right.parent)
+        self.assertEqual([a, b], list(left.values()))
+        self.assertEqual([a, c], list(right.values()))
+        self.assertEqual((0, 1, 2), (len(ir.Context()), len(root), len(left)))
+
+    def test_shared(self):
+        c = ast.TypeChecker()
+        s = """
+        def f {A: Type} {B: Type} (a: A) (b: B): A := a
+        example (x: Type) (y: x): x := f y y
+        """
+        s | ast.Parser() | ast.NameResolver() | c
+        ctxs = [h.locals for h in c.holes.values()]
+        self.assertEqual(4, len(ctxs))
+        self.assertEqual(1, len({id(_c(ir.Context, x.parent)) for x in ctxs}))
+        ps = _c(ir.Context, ctxs[0].parent).values()
+        self.assertEqual(["x", "y"], [p.name.text for p in ps])
+
+
+class TestZonk(TestCase):
+    def test_chain(self):
+        n = ir.cons.run(ir.Data(Name("N"), []))
+        hole = lambda: ir.Hole(0, False, ir.Context(), ir.Answer(ir.Type()))
+        holes = ir.Holes({k: hole() for k in range(4)})
+        holes.solve(0, ir.Placeholder(1, False))
+        holes.solve(1, ir.Placeholder(2, False))
+        i = ir.Inliner(holes, {})
+        self.assertEqual(ir.Placeholder(2, False), i.run(ir.Placeholder(0, False)))
+
+        holes.solve(2, n)
+        self.assertIs(n, i.run(ir.Placeholder(0, False)))
+        self.assertIs(n, holes[1].answer.nf)
+        stamp = holes[0].answer.stamp
+        holes.solve(3, ir.Type())
+        self.assertIs(n, i.run(ir.Placeholder(0, False)))
+        self.assertEqual(stamp, holes[0].answer.stamp)
+
+        holes[4], holes[5] = hole(), hole()
+        holes.solve(5, ir.Placeholder(4, False))
+        cp = holes.checkpoint()
+        holes.solve(4, n)
+        self.assertIs(n, i.run(ir.Placeholder(5, False)))
+        holes.rollback(cp)
+        self.assertEqual(ir.Placeholder(4, False), i.run(ir.Placeholder(5, False)))
+
+    def test_def(self):
+        s = "def f (g: {T: Type} -> (a: T) -> T) (x: Type): Type := g x"
+        d = _c(Def, (s | ast.Parser() | ast.NameResolver() | ast.TypeChecker())[0])
+        self.assertEqual("((g Type) x)", str(d.body))
+
+    def test_skip(self):
+        x, c = Name("x"), ast.TypeChecker()
+        v = ir.Fn(Param(x, ir.Type(), False), ir.Ref(x))
+        self.assertIs(v, c._zonk(v))
+        s = "def f (x: Type): Type := x"
+        s | ast.Parser() | ast.NameResolver() | c
+        self.assertEqual((0, 0), c.holes.stamp())
+
+
+class TestInstanceIndex(TestCase):
+    def test_candidates(self):
+        c, a, b, x = Name("C"), Name("A"), Name("B"), Name("x")
+        cls = lambda *xs: ir.Class(c, xs)
+        idx = ir.InstanceIndex()
+        self.assertEqual([], list(idx.candidates(cls(ir.Data(a, []), ir.Type()))))
+        idx.add(1, cls(ir.Data(a, []), ir.Type()))
+        idx.add(2, cls(ir.Ref(x), ir.Type()))
+        idx.add(3, cls(ir.Data(b, []), ir.Ref(x)))
+        idx.add(4, cls(ir.Data(a, []), ir.Data(b, [])))
+        self.assertEqual([1, 2], list(idx.candidates(cls(ir.Data(a, []), ir.Type()))))
+        self.assertEqual([2, 3], list(idx.candidates(cls(ir.Data(b, []), ir.Type()))))
+        self.assertEqual([1, 2, 3, 4], list(idx.candidates(cls(ir.Ref(x), ir.Ref(x)))))
+        self.assertEqual([], list(idx.candidates(cls(ir.Type(), ir.Data(a, [])))))
+
+    def test_resolve(self):
+        c, a, f = Name("C"), Name("A"), Name("f")
+        q = ir.Class(c, [ir.Data(a, [])])
+        inst = Instance(0, q, [(ir.Ref(f), ir.Type())], 1)
+        idx, seen, g = ir.InstanceIndex(), [], ir.Globals({1: inst})
+        match = lambda i: seen.append(i.id) or i
+        idx.add(1, q)
+        self.assertIs(inst, idx.resolve(g, q, match))
+        self.assertIs(inst, idx.resolve(g, q, match))
+        self.assertEqual(([1], 1), (seen, idx.hits))
+        self.assertEqual(ir.Type(), idx.field(inst, f))
+        idx.add(2, q)
+        idx.resolve(g, q, match)
+        self.assertEqual([1, 1], seen)
+
+    def test_resolve_failed(self):
+        text = """
+        inductive E where
+        | MkE
+        open E
+        inductive P (A: Type) (B: Type) where
+        | MkP (a: A) (b: B)
+        open P
+        class Default (T: Type) where
+            default: T
+        open Default
+        instance {A: Type} {B: Type} [a: Default A] [b: Default B]: Default (P A B)
+        where
+            default := MkP (default A (inst := a)) (default B (inst := b))
+        instance {A: Type} {B: Type} [a: Default A] [b: Default B]: Default (P A B)
+        where
+            default := MkP (default A (inst := a)) (default B (inst := b))
+        def f := default (P (P E E) (P E E))
+        """
+        c = ast.TypeChecker()
+        decls = text | ast.Parser() | ast.NameResolver()
+        with self.assertRaises(ir.NoInstanceError):
+            decls | c
+        cls = next(d for d in c.globals.values() if isinstance(d, ast.Class))
+        idx = ir.instances(c.globals, cls)
+        self.assertEqual(3, len(idx.resolved))
+        self.assertTrue(all(v is None for v in idx.resolved.values()))
+        self.assertEqual(2, idx.hits)
+        self.assertEqual(ir.Tabling(), c.globals.tabling)
+        self.assertIsNot(c.globals.tabling, ast.TypeChecker().globals.tabling)
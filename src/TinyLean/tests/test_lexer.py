@@ -0,0 +1,59 @@
+from unittest import TestCase
+
+from pyparsing import util
+
+from ..lexer import *
+
+
+def kinds(s: str):
+    return list(tokenize(s).kinds)
+
+
+class TestLexer(TestCase):
+    def test_words(self):
+        self.assertEqual(
+            [DEF, IDENT, IDENT, TYPE, UNDER, END], kinds("def f defx Type _")
+        )
+        self.assertEqual([IDENT, IDENT, END], kinds("café µ·"))
+
+    def test_symbols(self):
+        self.assertEqual(
+            [ASSIGN, ASSIGN, ARROW, ARROW, TO, TO, LAMBDA, COLON, SUB, END],
+            kinds(":= ≔ -> → => ↦ λ : -"),
+        )
+        self.assertEqual([JUNK, JUNK, END], kinds("=∀"))
+
+    def test_comments(self):
+        self.assertEqual([IDENT, IDENT, END], kinds("a /- b -- c -/ d"))
+        self.assertEqual([DIV, SUB, IDENT, END], kinds("/- e"))
+
+    def test_positions(self):
+        t = tokenize("def f\n  := x")
+        self.assertEqual(["def", "f", ":=", "x", ""], [t[i] for i in range(len(t))])
+        self.assertEqual([0, 4, 8, 11, 12], list(t.starts))
+        self.assertEqual([5, 10], [t.ends[1], t.ends[2]])
+
+    def test_inline(self):
+        t = tokenize("a b\nc /- d -/\ne\n/- f -/ g")
+        self.assertEqual([1, 1, 0, 0, 1, 1], list(t.inline))
+
+    def test_fences(self):
+        s = "```lean\na\n```\nx ```lean\n```lean4\n```\n```lean \n```\n```lean\nb\n````\n```"
+        want = [(8, "a\n"), (46, ""), (58, "b\n````\n")]
+        self.assertEqual(want, fences(s))
+        self.assertEqual(want, fences(s.encode()))
+        self.assertEqual([], fences("```lean\na\n"))
+
+    def test_source_map(self):
+        s = "a\n\nbc\r\n d\n"
+        m = source_map(s)
+        for loc in range(len(s) + 1):
+            self.assertEqual(util.lineno(loc, s), m.lineno(loc))
+            self.assertEqual(util.col(loc, s), m.col(loc))
+        self.assertEqual((1, 1), (source_map("").lineno(0), source_map("").col(0)))
+
+    def test_resync(self):
+        t = tokenize("inductive A where open B\n  def f := (\ndef g := x")
+        self.assertEqual(27, resync(t, 0, 0))
+        self.assertEqual(38, resync(t, 25, 37))
+        self.assertIsNone(resync(t, 38, 40))
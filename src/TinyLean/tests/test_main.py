@@ -1,6 +1,12 @@
+import subprocess
+import sys
+from mmap import mmap, ACCESS_READ
 from pathlib import Path
+from tempfile import TemporaryDirectory, TemporaryFile
 from unittest import TestCase
 
+from pyparsing import ParseBaseException
+
 from .. import ast, ir
 
 
@@ -130,6 +136,40 @@ Footer.
         self.assertEqual("refl", refl.name.text)
         self.assertEqual("sym", sym.name.text)
 
+    def test_markdown_error(self):
+        s = "# Título\n\n```lean\ndef a := Type\n```\n\n```lean\ndef b :=\n```\n"
+        with self.assertRaises(ParseBaseException) as e:
+            s | ast.Parser(is_markdown=True)
+        self.assertEqual(s.index(":=\n```\n") + 3, e.exception.loc)
+        self.assertEqual(9, e.exception.lineno)
+
+    def test_markdown_mmap(self):
+        with TemporaryFile() as f:
+            f.write("Ωmega\n```lean\ndef a := Type\n```\n".encode())
+            f.flush()
+            with mmap(f.fileno(), 0, access=ACCESS_READ) as m:
+                (d,) = m | ast.Parser(is_markdown=True)
+        self.assertEqual(18, d.loc)
+
+    def test_lazy_pyparsing(self):
+        code = "import sys, TinyLean.ast as a; 'def f := Type' | a.Parser(engine='native'); print('pyparsing' in sys.modules)"
+        src = Path(__file__).parent / ".." / ".."
+        r = subprocess.run([sys.executable, "-c", code], capture_output=True, cwd=src)
+        self.assertEqual(b"False", r.stdout.strip())
+
+    def test_main_only(self):
+        text = "def A: Type := Type\ndef a (x: A): A := x x\ndef b: A := Type\n"
+        with TemporaryDirectory() as d:
+            f = Path(d) / "only.lean"
+            f.write_text(text)
+            src = Path(__file__).parent / ".." / ".."
+            run = lambda *a: subprocess.run(
+                [sys.executable, "-m", "TinyLean", str(f), *a], cwd=src
+            ).returncode
+            self.assertEqual(1, run())
+            self.assertEqual(0, run("--only", "b"))
+            self.assertEqual(1, run("--only", "a"))
+
     def test_readme(self):
         p = Path(__file__).parent / ".." / ".." / ".." / ".github" / "README.md"
         with open(p, encoding="utf-8") as f:
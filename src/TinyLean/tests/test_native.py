@@ -0,0 +1,150 @@
+import re
+from unittest import TestCase
+
+from pyparsing import ParseBaseException, ParseException, ParseSyntaxException
+
+from . import README, shape
+from .. import ast, Def, Data, Instance
+
+native = lambda s: s | ast.Parser(engine="native")
+
+
+class TestNative(TestCase):
+    def assert_same(self, s: str):
+        self.assertEqual(shape(s | ast.Parser()), shape(native(s)))
+
+    def assert_same_error(self, s: str):
+        with self.assertRaises(ParseBaseException) as want:
+            s | ast.Parser()
+        with self.assertRaises(ParseBaseException) as got:
+            native(s)
+        self.assertEqual(type(want.exception), type(got.exception))
+        self.assertEqual(want.exception.loc, got.exception.loc)
+
+    def test_readme(self):
+        with open(README, encoding="utf-8") as f:
+            blocks = re.findall(r"```lean\n(.*?)```", f.read(), re.S)
+        self.assertGreater(len(blocks), 1)
+        for b in blocks:
+            self.assert_same(b)
+
+    def test_program(self):
+        self.assert_same(
+            """
+            inductive Vec (A: Type) (n: N) where
+            | Nil (n := Z)
+            | Cons {m: N} (a: A) (v: Vec A m) (n := S m)
+            open Vec
+
+            class Add {T: Type} where
+              add: (a: T) -> (b: T) -> T
+            open Add
+
+            instance: Add (T := N)
+            where
+              add := addN
+
+            instance {T: Type} [p: Add T]: Add (T := Vec T Z)
+            where
+              add := fun a b => a
+
+            def f {T: Type} [p: Add T] (x: T): T := λ y z ↦ add x (y + z) /- -/ z
+
+            example := match (f x) with | A a _ => nomatch a | _ => Type
+            """
+        )
+
+    def test_call_inline(self):
+        self.assert_same("def f := a /- c -/ b (T := c)\n/- d -/ (d)")
+        self.assert_same("def f :=\n  a (\n  b)")
+        self.assert_same("def f := Type Type")
+        self.assert_same("def f := a _ Type _x")
+        self.assert_same("def f := function funny")
+
+    def test_locations(self):
+        d, e = native("def f : Type := Type\nexample := fun x => x")
+        assert isinstance(d, Def)
+        self.assertEqual(4, d.loc)
+        assert isinstance(d.ret, ast.Type)
+        self.assertEqual(8, d.ret.loc)
+        assert isinstance(e.body, ast.Fn)
+        self.assertEqual(32, e.body.loc)
+        self.assertEqual(41, e.body.body.loc)
+
+    def test_spans(self):
+        s = "def f (x: A) : A := g (x) /- c -/\n\ninstance: C\nwhere a := b + (c)\n"
+        d, i = native(s)
+        self.assertEqual("f (x: A) : A := g (x)", s[d.loc : d.end])
+        self.assertEqual("g (x)", s[d.body.loc : d.body.end])
+        self.assertEqual("x", s[d.body.arg.loc : d.body.arg.end])
+        self.assertEqual("A", s[d.ret.loc : d.ret.end])
+        self.assertEqual(s.index("instance"), i.loc)
+        self.assertEqual(len(s.rstrip()), i.end)
+        self.assertEqual("b + (c)", s[i.fields[0][1].loc : i.fields[0][1].end])
+        self.assertEqual(shape(s | ast.Parser()), shape([d, i]))
+
+    def test_names(self):
+        for ds in (native("def f := fun f => f"), "def f := fun f => f" | ast.Parser()):
+            d = ds[0]
+            assert isinstance(d, Def) and isinstance(d.body, ast.Fn)
+            self.assertIs(d.name.text, d.body.param.text)
+            self.assertNotEqual(d.name, d.body.param)
+            self.assertEqual(d.name.id, hash(d.name))
+            self.assertFalse(hasattr(d.name, "__dict__"))
+
+    def test_infix_chain(self):
+        x = native("def f := a + b * c - d")[0].body
+        assert isinstance(x, ast.Call)
+        self.assertEqual("sub", x.callee.callee.name.text)
+        self.assertEqual(0 + 9, x.loc)
+        add = x.callee.arg
+        self.assertEqual("add", add.callee.callee.name.text)
+        mul = add.arg
+        self.assertEqual("mul", mul.callee.callee.name.text)
+        self.assertEqual(13, mul.loc)
+        for s in [
+            "def f := a + b + c",
+            "def f := a * b - c / d * e + f",
+            "def f := (a + b) * c - (d) / e",
+            "def f := a + fun x => x + b",
+        ]:
+            self.assert_same(s)
+
+    def test_errors(self):
+        for s in [
+            "def",
+            "def f :=",
+            "def f := (",
+            "def f := (x : T)",
+            "def f (a: Type := a",
+            "def f := x + ",
+            "def f := a\n  b",
+            "def f := n + match x",
+            "def f := a -> b",
+            "def f := a + b + fun => c",
+            "def f := nomatch\n x",
+            "class A where openB",
+            "instance: C where",
+            "garbage",
+            "/- unterminated",
+        ]:
+            self.assert_same_error(s)
+
+    def test_errors_condition(self):
+        with self.assertRaises(ParseException) as e:
+            native("\ninductive A where\n| B\nopen C")
+        self.assertEqual(1, e.exception.loc)
+        self.assertIn("open and datatype name mismatch", str(e.exception))
+
+    def test_errors_fatal(self):
+        with self.assertRaises(ParseSyntaxException) as e:
+            native("def f := fun => x")
+        self.assertEqual(13, e.exception.loc)
+
+    def test_declarations(self):
+        d, i = native("inductive D where | A open D\ninstance: C\nwhere\n  c := A")
+        assert isinstance(d, Data)
+        self.assertEqual("A", d.ctors[0].name.text)
+        assert isinstance(i, Instance)
+        self.assertEqual(29, i.loc)
+        self.assertEqual("c", i.fields[0][0].name.text)
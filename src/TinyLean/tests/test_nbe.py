@@ -0,0 +1,64 @@
+import os
+from unittest import TestCase, mock
+
+from . import test_checker, test_main
+from .bench import squares, layers
+from .. import ast, ir, nbe, Name, Param
+
+NBE = mock.patch.dict(os.environ, {ast.ENGINE: "nbe"})
+
+
+@NBE
+class TestNbEChecker(test_checker.TestTypeChecker): ...
+
+
+@NBE
+class TestNbEMain(test_main.TestMain): ...
+
+
+class TestNbE(TestCase):
+    def test_engine(self):
+        with NBE:
+            self.assertEqual("nbe", ast.TypeChecker().engine)
+        self.assertEqual("ir", ast.TypeChecker().engine)
+
+    def test_church(self):
+        decls = squares(2) | ast.Parser() | ast.NameResolver()
+        out = {e: decls | ast.TypeChecker(engine=e) for e in ast.ENGINES}
+
+        def count(v: ir.IR):
+            while isinstance(v, ir.Fn):
+                v = v.body
+            n = 0
+            while isinstance(v, ir.Call):
+                n, v = n + 1, v.arg
+            return n
+
+        self.assertEqual(81, count(out["ir"][-1].body))
+        self.assertEqual(81, count(out["nbe"][-1].body))
+
+    def test_de_bruijn(self):
+        x, y = Name("x"), Name("y")
+        fn = lambda a, b: ir.Fn(Param(a, ir.Type(), False), b)
+        v = fn(x, fn(y, ir.Ref(x)))
+        self.assertEqual(nbe.Var(1), nbe.index(v, {}, 0).body.body)
+
+        e = nbe.Inliner({}, {})
+        self.assertTrue(e.eq(v, fn(y, fn(x, ir.Ref(y)))))
+        self.assertFalse(e.eq(v, fn(y, fn(x, ir.Ref(x)))))
+
+        f = e.apply(v, ir.Ref(y))
+        assert isinstance(f, ir.Fn)
+        self.assertNotEqual(y.id, f.param.name.id)
+        self.assertEqual(ir.Ref(y), f.body)
+
+    def test_delta(self):
+        decls = layers(1, 6) | ast.Parser() | ast.NameResolver()
+        c = ast.TypeChecker(engine="nbe")
+        *_, f, p, e = decls | c
+        x = Name("x")
+        want = ir.Call(ir.Global(f.name), ir.Ref(x))
+        conv = nbe.Converter(c.holes, c.globals)
+        self.assertTrue(conv.eq(want, ir.Call(ir.Global(f.name), ir.Ref(x))))
+        self.assertEqual({}, conv.glued)
+        self.assertFalse(conv.eq(want, ir.Call(ir.Global(f.name), ir.Ref(Name("y")))))
@@ -438,6 +438,14 @@ class TestParser(TestCase):
         self.assertEqual("add", n.name.text)
         assert isinstance(v, ast.FnType)
 
+    def test_parse_instance_params(self):
+        s = "instance {T: Type} [p: Show T]: Show (List T)\nwhere"
+        x = parse(grammar.inst, s)[0]
+        assert isinstance(x, Instance)
+        self.assertEqual(["T", "p"], [p.name.text for p in x.params])
+        self.assertTrue(x.params[1].is_class)
+        assert isinstance(x.type, ast.Call)
+
     def test_parse_infix_op(self):
         x = parse(grammar.expr, "x + y")[0]
         assert isinstance(x, ast.Call)
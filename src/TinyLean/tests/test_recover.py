@@ -0,0 +1,63 @@
+import subprocess
+import sys
+from pathlib import Path
+from tempfile import TemporaryDirectory
+from unittest import TestCase
+
+from . import PROGRAM, shape
+from .. import ast
+
+DIRTY = """def a := x
+def b : T
+def c := y
+inductive N where
+| Z
+open M
+  def d := (z
+def e := w
+"""
+
+
+class TestRecover(TestCase):
+    def test_clean(self):
+        for engine in ("pyparsing", "native"):
+            p = ast.RecoveringParser(engine=engine)
+            self.assertEqual(shape(PROGRAM | ast.Parser()), shape(PROGRAM | p))
+            self.assertEqual([], p.errors)
+
+    def test_errors(self):
+        for engine in ("pyparsing", "native"):
+            p = ast.RecoveringParser(engine=engine)
+            ds = DIRTY | p
+            self.assertEqual(["a", "c", "e"], [d.name.text for d in ds])
+            self.assertEqual([3, 4, 8], [e.lineno for e in p.errors])
+            self.assertEqual(DIRTY.index("c :="), ds[1].loc)
+
+    def test_markdown(self):
+        s = "# A\n\n```lean\ndef a := (\n```\n\n```lean\ndef b :=\ndef c := b\n```\n"
+        p = ast.RecoveringParser(is_markdown=True)
+        (c,) = s | p
+        self.assertEqual(s.index("c :="), c.loc)
+        self.assertEqual([5, 9], [e.lineno for e in p.errors])
+
+    def test_main(self):
+        with TemporaryDirectory() as d:
+            f = Path(d) / "dirty.lean"
+            f.write_text(DIRTY.replace("def a := x", "def a := Type"))
+            src = Path(__file__).parent / ".." / ".."
+            cmd = [sys.executable, "-m", "TinyLean", str(f)]
+            r = subprocess.run(cmd, capture_output=True, text=True, cwd=src)
+        self.assertEqual(1, r.returncode)
+        lines = r.stdout.splitlines()
+        self.assertEqual(3, len(lines))
+        self.assertTrue(lines[0].startswith(f"{f}:3:1: "))
+
+    def test_main_semantic_error(self):
+        with TemporaryDirectory() as d:
+            f = Path(d) / "semantic.lean"
+            f.write_text(DIRTY)
+            src = Path(__file__).parent / ".." / ".."
+            cmd = [sys.executable, "-m", "TinyLean", str(f)]
+            r = subprocess.run(cmd, capture_output=True, text=True, cwd=src)
+        self.assertEqual(1, r.returncode)
+        self.assertEqual([f"{f}:1:10: undefined variable 'x'"], r.stdout.splitlines())
@@ -1,6 +1,6 @@
 from unittest import TestCase
 
-from . import resolve_expr, resolve, resolve_md
+from . import resolve_expr, resolve, resolve_md, PROGRAM
 from .. import ast, Data
 
 
@@ -215,3 +215,29 @@ Footer.
         name, loc = e.exception.args
         self.assertEqual("c", name)
         self.assertEqual(text.rindex("c :="), loc)
+
+    def test_dependency_graph(self):
+        r = ast.NameResolver()
+        PROGRAM | ast.Parser() | r
+        g, ids = r.graph, r.graph.ids
+        name = lambda i: next(t for t, j in ids.items() if j == i)
+        deps = lambda t: sorted(map(name, g.dependencies(ids[t])))
+        self.assertEqual(["CN", "_3", "addCN"], deps("_6"))
+        self.assertEqual(["N", "Vec", "v0"], deps("v1"))
+        vec = g.dependencies(ids["Vec"])
+        self.assertEqual(vec | {ids["Vec"]}, g.dependencies(ids["Cons"]))
+        add = g.dependencies(ids["add"])
+        self.assertEqual(
+            {ids["Add"], ids["N"], ids["addN"], *g.instances[ids["Add"]]}, add
+        )
+        self.assertIn(ids["_6"], g.dependents(ids["addCN"]))
+        self.assertNotIn(ids["_9"], g.dependents(ids["addCN"]))
+
+    def test_check_only(self):
+        text = "def A: Type := Type\ndef a (x: A): A := x x\ndef b: A := Type\n"
+        with self.assertRaises(ast.TypeMismatchError):
+            ast.check_string(text)
+        (a, b) = ast.check_only(text, "b")
+        self.assertEqual(["A", "b"], [a.name.text, b.name.text])
+        with self.assertRaises(ast.UndefinedVariableError):
+            ast.check_only(text, "c")
@@ -0,0 +1,47 @@
+from unittest import TestCase
+
+from pyparsing import ParseSyntaxException
+
+from . import PROGRAM
+from .. import ast, Def
+
+
+class TestStream(TestCase):
+    def test_same_as_check_string(self):
+        want = ast.check_string(PROGRAM)
+        for engine in ("pyparsing", "native"):
+            got = list(ast.check_stream(PROGRAM, engine=engine))
+            self.assertEqual([type(d) for d in want], [type(d) for d in got])
+
+    def test_lazy(self):
+        s = "def a: Type := Type\ndef b: Type := c\ndef d := ("
+        for engine in ("pyparsing", "native"):
+            ds = ast.check_stream(s, engine=engine)
+            d = next(ds)
+            assert isinstance(d, Def)
+            self.assertEqual("a", d.name.text)
+            with self.assertRaises(ast.UndefinedVariableError):
+                next(ds)
+
+    def test_parse_error(self):
+        s = "def a: Type := Type\ndef b := (\ndef c: Type := Type"
+        with self.assertRaises(ParseSyntaxException) as want:
+            s | ast.Parser()
+        for engine in ("pyparsing", "native"):
+            ds = ast.Parser(engine=engine).stream(s)
+            self.assertEqual("a", next(ds).name.text)
+            with self.assertRaises(ParseSyntaxException) as got:
+                next(ds)
+            self.assertEqual(want.exception.loc, got.exception.loc)
+
+    def test_unsolved_at_end(self):
+        ds = ast.check_stream("def a: Type := _\ndef b: Type := Type")
+        self.assertEqual(["a", "b"], [next(ds).name.text, next(ds).name.text])
+        with self.assertRaises(ast.UnsolvedPlaceholderError):
+            next(ds)
+
+    def test_markdown(self):
+        s = "# A\n```lean\ndef a: Type := Type\n```\n```lean\ndef b: Type := a\n```\n"
+        ds = list(ast.check_stream(s, True, "native"))
+        self.assertEqual(["a", "b"], [d.name.text for d in ds])
+        self.assertEqual(s.index("b:"), ds[1].loc)